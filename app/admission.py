@@ -0,0 +1,225 @@
+"""Admission control: per-user rate limits by cost class plus a global in-flight cap.
+
+Every ``/api`` request is classified (cheap read, upstream-backed lookup, import/export)
+and charged against a token bucket keyed on the caller's JWT subject, or the client IP for
+anonymous calls. Over its rate a caller gets ``429`` with ``Retry-After``.
+
+Admitted requests then need one of ``max_concurrency`` slots. When all are taken,
+requests wait in a bounded queue for at most their class's ``max_wait``. Imports don't
+wait at all, so under overload low-priority work is shed at once with ``503`` instead of
+adding latency for every user.
+"""
+from __future__ import annotations
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+import orjson
+from jose import JWTError, jwt
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class CostClass:
+    name: str
+    rate: float  # tokens refilled per second
+    burst: float  # bucket size
+    max_wait: float  # seconds to queue for a slot when saturated; 0 = shed immediately
+
+
+def default_classes() -> Dict[str, CostClass]:
+    return {
+        "cheap": CostClass("cheap", settings.admission_cheap_rate, settings.admission_cheap_burst, 2.0),
+        "upstream": CostClass("upstream", settings.admission_upstream_rate, settings.admission_upstream_burst, 0.5),
+        "import": CostClass("import", settings.admission_import_rate, settings.admission_import_burst, 0.0),
+    }
+
+
+# (method or "*", path prefix) -> class name; first match wins, other /api paths are "cheap"
+RULES: Tuple[Tuple[str, str, str], ...] = (
+    ("POST", "/api/anilist/import", "import"),
+    ("POST", "/api/library/import", "import"),
+    ("GET", "/api/library/export", "import"),
+    # Mostly catalog hits, one per visible card; the handler charges "upstream" on a miss
+    ("GET", "/api/sources/max", "cheap"),
+    ("*", "/api/sources/", "upstream"),
+    # bcrypt makes these CPU-heavy; anonymous, so they are limited per client IP
+    ("POST", "/api/auth/token", "upstream"),
+    ("POST", "/api/auth/register", "upstream"),
+)
+
+
+STATE_KEY = "admission"
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Cost class name for a request, or None for paths that bypass admission (static, /health)."""
+    if not path.startswith("/api/"):
+        return None
+    for rule_method, prefix, name in RULES:
+        if (rule_method == "*" or rule_method == method) and path.startswith(prefix):
+            return name
+    return "cheap"
+
+
+class TokenBuckets:
+    """Token buckets per (caller, class), least recently used callers evicted past ``max_keys``."""
+
+    def __init__(self, max_keys: int = 10_000) -> None:
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Tuple[str, str], Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, cls: CostClass, now: Optional[float] = None) -> float:
+        """Consume one token; returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        bucket_key = (key, cls.name)
+        tokens, stamp = self._buckets.pop(bucket_key, (cls.burst, now))
+        tokens = min(cls.burst, tokens + (now - stamp) * cls.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / cls.rate if cls.rate > 0 else math.inf
+        self._buckets[bucket_key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyGate:
+    """At most ``limit`` requests in flight; up to ``max_queue`` more wait in FIFO order.
+
+    A released slot is handed straight to the oldest waiter, so queued requests can't be
+    overtaken by new arrivals.
+    """
+
+    def __init__(self, limit: int, max_queue: int) -> None:
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+    async def acquire(self, max_wait: float) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if max_wait <= 0 or len(self._waiters) >= self.max_queue:
+            return False
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), max_wait)
+            return True
+        except BaseException as exc:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we gave up: keep it, or give it back on cancel
+                if isinstance(exc, asyncio.TimeoutError):
+                    return True
+                self.release()
+            else:
+                fut.cancel()
+                self._waiters.remove(fut)
+            if isinstance(exc, asyncio.TimeoutError):
+                return False
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+
+def caller_key(scope: Scope) -> str:
+    """JWT subject of a valid bearer token, else the client IP."""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    sub = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm]).get("sub")
+                except JWTError:
+                    sub = None
+                if sub:
+                    return f"user:{sub}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def charge(scope: Scope, name: str) -> float:
+    """Charge the caller one more ``name`` token from inside a handler, like :meth:`TokenBuckets.take`.
+
+    For endpoints admitted as cheap that only sometimes call upstream. Returns 0 when the
+    request didn't pass through the middleware (admission disabled).
+    """
+    admission = scope.get("state", {}).get(STATE_KEY)
+    if admission is None:
+        return 0.0
+    middleware, key = admission
+    return middleware.buckets.take(key, middleware.classes[name])
+
+
+def retry_after(wait: float) -> str:
+    return str(max(1, math.ceil(wait)) if math.isfinite(wait) else 3600)
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware, so the slot is held until a streamed body (exports) finishes."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        classes: Optional[Dict[str, CostClass]] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+    ) -> None:
+        self.app = app
+        self.classes = classes or default_classes()
+        self.buckets = TokenBuckets()
+        self.gate = ConcurrencyGate(
+            max_concurrency if max_concurrency is not None else settings.admission_max_concurrency,
+            max_queue if max_queue is not None else settings.admission_max_queue,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        name = classify(scope.get("method", ""), scope["path"]) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        cls = self.classes[name]
+        key = caller_key(scope)
+        wait = self.buckets.take(key, cls)
+        if wait > 0:
+            await _reject(send, 429, f"Rate limit exceeded for {name} requests", wait)
+            return
+        if not await self.gate.acquire(cls.max_wait):
+            await _reject(send, 503, "Server busy, retry shortly", settings.admission_retry_after)
+            return
+        scope.setdefault("state", {})[STATE_KEY] = (self, key)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.gate.release()
+
+
+async def _reject(send: Send, status: int, detail: str, wait: float) -> None:
+    body = orjson.dumps({"detail": detail})
+    start: Message = {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", retry_after(wait).encode()),
+        ],
+    }
+    await send(start)
+    await send({"type": "http.response.body", "body": body})
@@ -7,11 +7,54 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24
     database_url: str = "sqlite:///./app.db"
+    # Create tables at worker startup. Disable in multi-worker deployments and run
+    # `python -m app.migrate` once before starting workers instead.
+    auto_create_schema: bool = True
+    # Dev mode: expose per-request SQL statement count/time as response headers
+    debug_query_stats: bool = False
+    # Responses smaller than this are sent uncompressed
+    gzip_minimum_size: int = 1024
+    gzip_level: int = 6
+    # Admission control (app/admission.py): per-user token buckets (rate per second, burst)
+    # for each cost class, and a global cap on in-flight /api requests with a bounded queue
+    admission_enabled: bool = True
+    admission_cheap_rate: float = 20.0
+    admission_cheap_burst: float = 60
+    admission_upstream_rate: float = 3.0
+    admission_upstream_burst: float = 30
+    admission_import_rate: float = 1 / 60
+    admission_import_burst: float = 3
+    # Keep below the SQLAlchemy pool (5 + 10 overflow): requests hold a pooled connection
+    # from get_current_user until they finish, and a checkout that has to wait blocks the loop
+    admission_max_concurrency: int = 12
+    admission_max_queue: int = 64
+    admission_retry_after: float = 1.0
+    # Opt-in profiling (app/profiling.py): nothing is registered unless enabled, and only the
+    # comma-separated admin usernames may use the X-Profile header or /api/debug/profile
+    profiling_enabled: bool = False
+    profiling_admins: str = ""
+    profiling_max_seconds: float = 60.0
 
     # AniList OAuth settings
     anilist_client_id: str = "29366"
     anilist_client_secret: str = "Ia0qEaUMlDApQwT3vP7SeNArR4wpH8aE5OQzPCAS"
     anilist_app_name: str = "Test"
+    # GraphQL endpoint; overridable so benchmarks/tests can point at a local fake
+    anilist_graphql_url: str = "https://graphql.anilist.co"
+    # How long cached AniList catalog entries (used by /api/sources/max) stay valid
+    catalog_ttl_hours: int = 24 * 7
+    # Trending feed snapshot (see app/services/trending.py); refresh 0 disables the background task
+    trending_snapshot_path: str = "./trending_snapshot.json"
+    trending_per_page: int = 20
+    trending_refresh_seconds: int = 900
+    # New-release poller (app/services/releases.py); 0 seconds disables the background task
+    release_poll_seconds: int = 300
+    release_batch_size: int = 50
+    release_max_per_cycle: int = 2000
+    release_batch_pause: float = 1.0
+    # Recommendations model written by `python -m app.services.recommendations`
+    recommendations_dir: str = "./recommendations"
+    recommendations_top_k: int = 50
     # Default redirect points to backend callback; override via .env if needed
     anilist_redirect_uri: str = "http://127.0.0.1:8000/api/anilist/callback"
 
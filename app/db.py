@@ -1,34 +1,64 @@
 import os
-from typing import Optional
+from typing import Any, Optional
 from sqlmodel import SQLModel, create_engine, Session
 from sqlalchemy.engine import Engine
 from .config import settings
+from .instrumentation import instrument_engine
 
 # Lazily create engine so that test environment variables are available
 engine: Optional[Engine] = None
 _initialized = False
 
 
+def is_testing() -> bool:
+    return bool(os.getenv("PYTEST_CURRENT_TEST") or os.getenv("PYTEST") or os.getenv("TESTING") == "1")
+
+
 def _compute_db_url() -> str:
     # Use a separate database for tests to avoid polluting local data
-    if os.getenv("PYTEST_CURRENT_TEST") or os.getenv("PYTEST") or os.getenv("TESTING") == "1":
+    if is_testing():
         return "sqlite:///./app_test.db"
     return settings.database_url
 
 
-def init_db():
-    global _initialized
+def dialect_insert(dialect_name: str) -> Optional[Any]:
+    """The backend's ``insert`` construct with ON CONFLICT support, or None if it has none."""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+
+def get_engine() -> Engine:
     global engine
     if engine is None:
         engine = create_engine(_compute_db_url(), echo=False)
+        instrument_engine(engine)
+    return engine
+
+
+def init_db():
+    """Create missing tables and apply in-place upgrades (see app/migrate.py).
+
+    In production this runs once per deploy via ``python -m app.migrate`` (with
+    ``AUTO_CREATE_SCHEMA=0``) instead of in every worker; dev and tests keep creating
+    tables on startup/first use.
+    """
+    global _initialized
+    eng = get_engine()
     if not _initialized:
-        SQLModel.metadata.create_all(engine)
+        from .migrate import upgrade  # local import: migrate depends on this module
+        SQLModel.metadata.create_all(eng)
+        upgrade(eng)
         _initialized = True
 
 
 def get_session():
     # lazy init in case app lifespan wasn't run (e.g., tests creating TestClient without context)
-    init_db()
-    assert engine is not None
-    with Session(engine) as session:
+    if not _initialized and settings.auto_create_schema:
+        init_db()
+    with Session(engine or get_engine()) as session:
         yield session
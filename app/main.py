@@ -1,19 +1,52 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
 from .routers import auth, library, sources
 from .routers import anilist as anilist_router
-from .db import init_db
+from .routers import trending
+from .routers import recommendations
+from .services.trending import trending_snapshot
+from .services.releases import release_poller
+from .db import get_engine, init_db, is_testing
+from .config import settings
+from .instrumentation import start_tracking, QUERY_COUNT_HEADER, QUERY_TIME_HEADER
+from .admission import AdmissionMiddleware
+from .static import FrontendFiles
 from contextlib import asynccontextmanager
+import asyncio
+import os
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    if settings.auto_create_schema:
+        init_db()
+    else:
+        get_engine()
+    # Serve the persisted trending snapshot right away; the task refreshes it in the background
+    trending_snapshot.load()
+    tasks = []
+    if settings.trending_refresh_seconds > 0:
+        tasks.append(asyncio.create_task(trending_snapshot.run(settings.trending_refresh_seconds)))
+    if settings.release_poll_seconds > 0:
+        tasks.append(asyncio.create_task(release_poller.run(settings.release_poll_seconds)))
     yield
+    for task in tasks:
+        task.cancel()
+    # Let them hand back their leases so another worker takes over without waiting for expiry
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 app = FastAPI(title="Anime & Manga Tracker", version="0.1.0", lifespan=lifespan)
 
+if settings.profiling_enabled:
+    # Innermost, so a profile covers the route and not time spent queued by admission control
+    from .profiling import ProfilingMiddleware
+    from .routers import debug
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(debug.router, prefix="/api/debug", tags=["debug"])
+if settings.admission_enabled:
+    # Added first so it sits inside CORS: shed 429/503 responses still carry CORS headers
+    app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,14 +54,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress API payloads (large library lists) above a size threshold. Precompressed static
+# files already carry Content-Encoding and pass through untouched.
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size, compresslevel=settings.gzip_level)
+
+if settings.debug_query_stats or is_testing():
+    @app.middleware("http")
+    async def query_stats_headers(request: Request, call_next):
+        # Dev/test only: report how many SQL statements a request issued
+        stats = start_tracking()
+        response = await call_next(request)
+        response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+        response.headers[QUERY_TIME_HEADER] = f"{stats.elapsed_ms:.2f}"
+        return response
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(library.router, prefix="/api/library", tags=["library"])
 app.include_router(sources.router, prefix="/api/sources", tags=["sources"])
 app.include_router(anilist_router.router, prefix="/api/anilist", tags=["anilist"])
+app.include_router(trending.router, prefix="/api/trending", tags=["trending"])
+app.include_router(recommendations.router, prefix="/api/recommendations", tags=["recommendations"])
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
-app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
+# Serve the production build (hashed names + precompressed files) when present, see scripts/build_frontend.py
+FRONTEND_DIR = "frontend/dist" if os.path.isdir("frontend/dist") else "frontend"
+app.mount("/", FrontendFiles(directory=FRONTEND_DIR, html=True), name="frontend")
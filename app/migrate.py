@@ -0,0 +1,131 @@
+"""One-shot schema setup, run once per deploy before starting workers.
+
+    python -m app.migrate
+
+Creates missing tables, adds columns/indexes introduced since a table was created
+(``create_all`` alone only handles new tables) and backfills derived data. Workers started
+with ``AUTO_CREATE_SCHEMA=0`` then skip schema work entirely; with it on (dev/tests),
+``init_db`` runs the schema steps but never the backfills, which scan whole tables and
+belong to this one-shot command.
+"""
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+from sqlmodel import Session, SQLModel, select
+
+from . import models  # noqa: F401  (registers tables on SQLModel.metadata)
+from .db import get_engine, init_db
+
+BACKFILL_BATCH = 1000
+
+
+def _add_missing_columns(engine: Engine) -> None:
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(engine.dialect)}'
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if default is not None:
+                    ddl += f" NOT NULL DEFAULT {default!r}" if isinstance(default, str) else f" NOT NULL DEFAULT {default}"
+                conn.execute(text(ddl))
+
+
+def _enable_sqlite_autoincrement(engine: Engine) -> None:
+    """Rebuild SQLite tables created before they were declared ``sqlite_autoincrement``.
+
+    SQLite can't add AUTOINCREMENT in place: the table is renamed, recreated from the
+    model and its rows copied over, in one transaction. ``legacy_alter_table`` keeps the
+    rename from rewriting other tables' foreign keys to the old name. Indexes are
+    recreated by ``_create_missing_indexes`` right after.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    tables = [t for t in SQLModel.metadata.sorted_tables if t.dialect_options["sqlite"]["autoincrement"]]
+    if not tables:
+        return
+    raw = engine.raw_connection()
+    driver = raw.driver_connection
+    isolation = driver.isolation_level  # type: ignore[union-attr]
+    driver.isolation_level = None  # type: ignore[union-attr]  # manual BEGIN/COMMIT below
+    try:
+        cur = driver.cursor()  # type: ignore[union-attr]
+        cur.execute("PRAGMA legacy_alter_table=ON")
+        for table in tables:
+            cur.execute("BEGIN IMMEDIATE")
+            row = cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table.name,)).fetchone()
+            if row is None or "AUTOINCREMENT" in row[0].upper():
+                cur.execute("ROLLBACK")  # new table, or another worker got here first
+                continue
+            old = f"{table.name}__pre_autoincrement"
+            cur.execute(f'ALTER TABLE "{table.name}" RENAME TO "{old}"')
+            for (index,) in cur.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL", (old,)
+            ).fetchall():
+                cur.execute(f'DROP INDEX "{index}"')
+            cur.execute(str(CreateTable(table).compile(engine)))
+            columns = ", ".join(f'"{c.name}"' for c in table.columns)
+            cur.execute(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old}"')
+            cur.execute(f'DROP TABLE "{old}"')
+            cur.execute("COMMIT")
+        cur.execute("PRAGMA legacy_alter_table=OFF")
+    except BaseException:
+        if driver.in_transaction:  # type: ignore[union-attr]
+            driver.rollback()  # type: ignore[union-attr]
+        raise
+    finally:
+        driver.isolation_level = isolation  # type: ignore[union-attr]
+        raw.close()
+
+
+def _create_missing_indexes(engine: Engine) -> None:
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def _backfill_title_keys(engine: Engine) -> None:
+    from .models import LibraryItem
+    from .services.titles import index_items
+
+    with Session(engine) as session:
+        while True:
+            batch: List[LibraryItem] = list(
+                session.exec(select(LibraryItem).where(LibraryItem.title_key == "").limit(BACKFILL_BATCH)).all()
+            )
+            if not batch:
+                break
+            index_items(session, batch)
+            for item in batch:
+                # Keep the loop terminating even for titles that normalize to ""
+                item.title_key = item.title_key or "-"
+            session.commit()
+
+
+def upgrade(engine: Engine) -> None:
+    """Schema-only steps; cheap when there is nothing to do, so safe at worker startup."""
+    _add_missing_columns(engine)
+    _enable_sqlite_autoincrement(engine)
+    _create_missing_indexes(engine)
+
+
+def backfill(engine: Engine) -> None:
+    _backfill_title_keys(engine)
+
+
+def migrate() -> None:
+    init_db()
+    backfill(get_engine())
+
+
+if __name__ == "__main__":
+    migrate()
+    print(f"schema ready: {get_engine().url.render_as_string(hide_password=True)}")
@@ -1,6 +1,7 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from typing import Optional
 
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -15,22 +16,112 @@ class User(SQLModel, table=True):
 
 
 class LibraryItem(SQLModel, table=True):
+    # AUTOINCREMENT: SQLite would otherwise hand a deleted item's id to the next insert, and
+    # rows keyed on item ids that outlive the item (ProgressEvent) would attach to the new one
+    __table_args__ = (Index("ix_libraryitem_user_title_key", "user_id", "title_key"), {"sqlite_autoincrement": True})
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
 
     title: str
+    # normalize_title(title); used for dedup and catalog matching (see app/services/titles.py)
+    title_key: str = ""
     type: str  # anime|manga
     source: str
     cover_url: Optional[str] = None
+    # AniList media id when known (AniList import, autocomplete, or matched via CatalogEntry)
+    anilist_id: Optional[int] = Field(default=None, index=True)
 
     status: str = "planning"
     progress: int = 0
+    # Latest released episode/chapter seen by the release poller (app/services/releases.py);
+    # new_release is set while progress is behind it
+    latest_release: Optional[int] = None
+    new_release: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     user: Optional[User] = Relationship(back_populates="items")
 
 
+class TitleTrigram(SQLModel, table=True):
+    """Trigram index over LibraryItem.title_key for fuzzy matching within a user's library."""
+    __table_args__ = (Index("ix_titletrigram_user_gram", "user_id", "gram"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    item_id: int = Field(foreign_key="libraryitem.id", index=True)
+    user_id: int
+    gram: str
+
+
+class CatalogEntry(SQLModel, table=True):
+    """Local cache of AniList media, one row per normalized title (english/romaji/native).
+
+    Lets `/api/sources/max` answer by indexed lookup instead of an upstream search.
+    """
+    __table_args__ = (UniqueConstraint("type", "title_key", name="uq_catalogentry_type_key"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    anilist_id: int = Field(index=True)
+    type: str  # anime|manga
+    title_key: str
+    title: str
+    cover_url: Optional[str] = None
+    episodes: Optional[int] = None
+    chapters: Optional[int] = None
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class ProgressEvent(SQLModel, table=True):
+    """Append-only log of progress/status changes; never updated or deleted.
+
+    ``item_id`` is deliberately not a foreign key so history survives item deletion.
+    """
+    __table_args__ = (Index("ix_progressevent_user_time", "user_id", "occurred_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    item_id: int = Field(index=True)
+    type: str  # anime|manga
+    kind: str  # add|update|import
+    old_progress: Optional[int] = None
+    new_progress: int = 0
+    old_status: Optional[str] = None
+    new_status: str = "planning"
+    occurred_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class DailyProgress(SQLModel, table=True):
+    """Per-user, per-day, per-type rollup of ProgressEvent, updated as events are written."""
+    __table_args__ = (UniqueConstraint("user_id", "day", "type", name="uq_dailyprogress_user_day_type"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    day: date  # UTC
+    type: str
+    units: int = 0  # episodes/chapters advanced by progress updates
+    updates: int = 0  # progress/status update events
+    added: int = 0  # items added or imported
+    completed: int = 0  # status changes into "completed"
+
+
+class ReleaseWatch(SQLModel, table=True):
+    """One row per AniList media referenced by an in-progress library item, shared by all users."""
+    anilist_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    status: Optional[str] = None  # AniList MediaStatus: RELEASING, FINISHED, NOT_YET_RELEASED, HIATUS, ...
+    latest: Optional[int] = None  # latest released episode/chapter
+    next_airing_at: Optional[datetime] = None
+    checked_at: Optional[datetime] = None
+    next_check_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
+
+class Lease(SQLModel, table=True):
+    """Named lease so only one worker at a time runs a background job (app/services/leases.py)."""
+    name: str = Field(primary_key=True)
+    holder: str
+    expires_at: datetime
+
+
 class OAuthToken(SQLModel, table=True):
     """Stores OAuth access tokens per user and provider.
 
@@ -0,0 +1,147 @@
+"""Opt-in profiling for live workers, for admins only.
+
+Nothing here is imported or registered unless ``PROFILING_ENABLED=1`` (see app/main.py),
+so workers without the flag pay nothing. With it on, users listed in ``PROFILING_ADMINS``
+can:
+
+- profile one request by sending ``X-Profile: pstats`` (or ``raw``). The response body is
+  replaced by cProfile output, and the real status moves to ``X-Profiled-Status``.
+- sample the whole worker for N seconds with ``GET /api/debug/profile``. The result is
+  collapsed stacks (``frame;frame;frame count``) that flamegraph.pl and speedscope read.
+
+Both run on the event loop thread, so they also see other requests that interleave with
+the profiled one. cProfile only sees the thread it runs on, so sync dependencies that run
+in the threadpool show up in samples, not in the per-request pstats.
+"""
+from __future__ import annotations
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .admission import caller_key
+from .config import settings
+
+PROFILE_HEADER = b"x-profile"
+PROFILED_STATUS_HEADER = "X-Profiled-Status"
+FORMATS = {"pstats": b"text/plain; charset=utf-8", "raw": b"application/octet-stream"}
+PSTATS_LINES = 80
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One profile at a time: cProfile and the sampler would measure each other
+profile_lock = threading.Lock()
+
+
+def is_admin(username: Optional[str]) -> bool:
+    admins = {u.strip() for u in settings.profiling_admins.split(",") if u.strip()}
+    return bool(username) and username in admins
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(ROOT + os.sep):
+        return os.path.relpath(filename, ROOT)
+    parts = filename.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Dict[str, int]:
+    """Sample every thread's stack for ``seconds``; returns collapsed stack -> hit count.
+
+    Only frames on a thread's stack are seen: a suspended coroutine (awaiting I/O) is
+    invisible until it runs again, so this shows where the loop spends CPU.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    labels: Dict[object, str] = {}
+    counts: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack: List[str] = []
+            f = frame
+            while f is not None:
+                code = f.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+                stack.append(label)
+                f = f.f_back
+            stack.append(names.get(ident) or f"thread-{ident}")
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return dict(counts)
+
+
+def collapsed(counts: Dict[str, int]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+
+def render_profile(profiler: cProfile.Profile, fmt: str) -> bytes:
+    if fmt == "raw":
+        # Loadable with pstats.Stats / snakeviz after saving to a file
+        profiler.create_stats()
+        return marshal.dumps(profiler.stats)  # type: ignore[attr-defined]
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PSTATS_LINES)
+    return out.getvalue().replace(ROOT + os.sep, "").encode()
+
+
+class ProfilingMiddleware:
+    """Profile single requests that ask for it with the ``X-Profile`` header."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        fmt = None
+        if scope["type"] == "http":
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER:
+                    fmt = value.decode("latin-1").strip().lower()
+                    break
+        if fmt is None:
+            await self.app(scope, receive, send)
+            return
+        key = caller_key(scope)
+        if fmt not in FORMATS or not key.startswith("user:") or not is_admin(key[len("user:"):]):
+            # Not for us: serve the request normally rather than hint that profiling exists
+            await self.app(scope, receive, send)
+            return
+        if not profile_lock.acquire(blocking=False):
+            await _plain(send, 409, b"another profile is running", b"text/plain; charset=utf-8")
+            return
+        status = 0
+
+        async def swallow(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, swallow)
+            finally:
+                profiler.disable()
+        finally:
+            profile_lock.release()
+        await _plain(send, 200, render_profile(profiler, fmt), FORMATS[fmt], status)
+
+
+async def _plain(send: Send, status: int, body: bytes, content_type: bytes, profiled_status: int = 0) -> None:
+    headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), (b"cache-control", b"no-store")]
+    if profiled_status:
+        headers.append((PROFILED_STATUS_HEADER.lower().encode(), str(profiled_status).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
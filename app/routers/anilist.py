@@ -3,16 +3,17 @@ from typing import Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from ..config import settings
-from ..services.anilist_oauth import get_authorize_url, exchange_code_for_token, fetch_user_lists
 from ..db import get_session
+from sqlalchemy import insert
 from sqlmodel import Session, select
 from ..models import LibraryItem
+from ..services import catalog, progress as progress_log
+from ..services.titles import MISSING_KEYS, ensure_keys, index_items, normalize_title
 from .auth import get_current_user, User
 from jose import jwt, JWTError
 from datetime import datetime, timezone, timedelta
 from typing import cast
 from pydantic import BaseModel
-import httpx
 
 
 router = APIRouter()
@@ -45,6 +46,9 @@ def _parse_state(state: str) -> str:
 
 @router.get("/connect-url")
 async def connect_url(current_user: User = Depends(get_current_user)) -> Dict[str, str]:
+    # OAuth service (and httpx) are imported lazily: these endpoints are rarely hit,
+    # so workers don't pay for them at startup
+    from ..services.anilist_oauth import get_authorize_url
     state = _make_state(current_user.username)
     url = get_authorize_url(state)
     return {"url": url}
@@ -54,6 +58,8 @@ async def connect_url(current_user: User = Depends(get_current_user)) -> Dict[st
 async def anilist_callback(code: str | None = None, state: str | None = None):
     if not code or not state:
         raise HTTPException(status_code=400, detail="Missing code/state")
+    import httpx
+    from ..services.anilist_oauth import exchange_code_for_token
     username = _parse_state(state)
     try:
         token = await exchange_code_for_token(code)
@@ -113,6 +119,8 @@ async def import_anilist(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
 ) -> Dict[str, int]:
+    import httpx
+    from ..services.anilist_oauth import fetch_user_lists
     token = _anilist_tokens.get(current_user.username)
     if not token:
         raise HTTPException(status_code=400, detail="AniList not connected")
@@ -136,11 +144,24 @@ async def import_anilist(
     db_user = get_or_create_db_user(session, current_user.username)
     assert db_user.id is not None
 
-    imported = 0
+    # Avoid duplicates: one query for the keys already in the library, then set lookups.
+    # Any of the entry's titles (english/romaji/native) matching counts as a duplicate.
+    ensure_keys(session, db_user.id)
+    seen: Dict[str, set[str]] = {}
+    for mtype_key, key in session.exec(
+        select(LibraryItem.type, LibraryItem.title_key).where(LibraryItem.user_id == db_user.id)
+    ).all():
+        if key not in MISSING_KEYS:
+            seen.setdefault(mtype_key, set()).add(key)
+
+    new_items: list[LibraryItem] = []
+    catalog_rows: Dict[str, list[Dict[str, Any]]] = {}
     for lst in lists:
         for entry in lst.get("entries", []):
             media = entry.get("media", {})
-            title = media.get("title", {}).get("english") or media.get("title", {}).get("romaji") or media.get("title", {}).get("native") or "Untitled"
+            title_obj: Dict[str, Any] = media.get("title") or {}
+            title = title_obj.get("english") or title_obj.get("romaji") or title_obj.get("native") or "Untitled"
+            alt_titles = [t for t in (title_obj.get("english"), title_obj.get("romaji"), title_obj.get("native")) if t]
             cover_any: Any = media.get("coverImage") or {}
             if isinstance(cover_any, dict):
                 cover = cast(Dict[str, Any], cover_any)
@@ -151,29 +172,52 @@ async def import_anilist(
             progress = entry.get("progress") or 0
             mtype = (media.get("type") or "ANIME").lower()
 
-            # Avoid duplicates: check by title+type+source
-            existing = session.exec(
-                select(LibraryItem).where(
-                    (LibraryItem.user_id == db_user.id) &
-                    (LibraryItem.title == title) &
-                    (LibraryItem.type == mtype) &
-                    (LibraryItem.source == "anilist")
-                )
-            ).first()
-            if existing:
+            if media.get("id"):
+                catalog_rows.setdefault(mtype, []).append({
+                    "id": str(media["id"]),
+                    "title": title,
+                    "titles": alt_titles,
+                    "cover_url": cover_url,
+                    "episodes": media.get("episodes"),
+                    "chapters": media.get("chapters"),
+                })
+
+            keys = {normalize_title(t) for t in alt_titles} or {normalize_title(title)}
+            type_seen = seen.setdefault(mtype, set())
+            if keys & type_seen:
                 continue
+            type_seen.update(keys)
 
             rec = LibraryItem(
                 user_id=db_user.id,
                 title=title,
+                title_key=normalize_title(title),
                 type=mtype,
                 source="anilist",
                 cover_url=cover_url,
+                anilist_id=media.get("id"),
                 status=status.lower(),
                 progress=progress,
             )
-            session.add(rec)
-            imported += 1
-
+            new_items.append(rec)
+
+    if new_items:
+        # One multi-row INSERT ... RETURNING; an ORM flush issued one INSERT per entry. SQLite
+        # doesn't promise RETURNING order, so ids are matched back by (type, title_key),
+        # which the dedup above keeps unique.
+        returned = session.connection().execute(
+            insert(LibraryItem).returning(LibraryItem.id, LibraryItem.type, LibraryItem.title_key),  # type: ignore[arg-type]
+            [rec.model_dump(exclude={"id"}) for rec in new_items],
+        ).all()
+        ids = {(t, key): item_id for item_id, t, key in returned}
+        for rec in new_items:
+            rec.id = ids[(rec.type, rec.title_key)]
+    index_items(session, new_items)
+    progress_log.record(session, [
+        progress_log.event(db_user.id, rec.id, rec.type, "import", rec.progress, rec.status)  # type: ignore[arg-type]
+        for rec in new_items
+    ])
+    for mtype, rows in catalog_rows.items():
+        catalog.remember(session, mtype, rows)
     session.commit()
-    return {"imported": imported}
+    return {"imported": len(new_items)}
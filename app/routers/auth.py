@@ -1,21 +1,23 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Dict, Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlmodel import Session, select
 from ..config import settings
 from ..db import get_session
 from ..models import User as UserModel
 
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
 router = APIRouter()
@@ -35,8 +37,18 @@ class User(BaseModel):
 class UserInDB(User):
     hashed_password: str
 
+@lru_cache(maxsize=None)
+def get_pwd_context() -> "CryptContext":
+    # passlib/bcrypt are only needed for login/register, so they load on first use
+    # instead of at worker import time
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def hash_password(password: str) -> str:
+    return get_pwd_context().hash(password)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_user(db: Dict[str, Dict[str, Any]], username: str) -> Optional[UserInDB]:
     user = db.get(username)
@@ -92,7 +104,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Sessi
             db_user = UserModel(
                 username="demo",
                 full_name="Demo User",
-                hashed_password=pwd_context.hash("demo1234"),
+                hashed_password=hash_password("demo1234"),
             )
             session.add(db_user)
             session.commit()
@@ -134,7 +146,7 @@ def register(req: RegisterRequest, session: Session = Depends(get_session)) -> R
     user = UserModel(
         username=req.username,
         full_name=req.full_name,
-        hashed_password=pwd_context.hash(req.password),
+        hashed_password=hash_password(req.password),
     )
     session.add(user)
     session.commit()
@@ -0,0 +1,38 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from .auth import get_current_user, User
+from ..config import settings
+from .. import profiling
+
+router = APIRouter()
+
+
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not profiling.is_admin(current_user.username):
+        raise HTTPException(status_code=403, detail="Admins only")
+    return current_user
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def sample_profile(
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    _: User = Depends(require_admin),
+) -> PlainTextResponse:
+    """Sample the worker's threads for ``seconds`` and return collapsed stacks for a flamegraph.
+
+    Only mounted with ``PROFILING_ENABLED=1``; see app/profiling.py.
+    """
+    if seconds > settings.profiling_max_seconds:
+        raise HTTPException(status_code=422, detail=f"seconds must be <= {settings.profiling_max_seconds}")
+    if not profiling.profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Another profile is running")
+    try:
+        # The sampler runs in a thread so the event loop keeps serving the traffic being sampled
+        counts = await asyncio.to_thread(profiling.sample_stacks, seconds, interval_ms / 1000)
+    finally:
+        profiling.profile_lock.release()
+    return PlainTextResponse(profiling.collapsed(counts), headers={"Cache-Control": "no-store"})
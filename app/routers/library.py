@@ -1,15 +1,19 @@
 from __future__ import annotations
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlmodel import Session, select
+from sqlmodel import Session, select, func
 
-from .auth import get_current_user, User, pwd_context
+from .auth import get_current_user, User, hash_password
 from ..models import LibraryItem, User as UserModel
 from ..db import get_session
+from ..services import progress as progress_log, transfer
+from ..services.releases import IN_PROGRESS
+from ..services.titles import index_items, unindex_item, ensure_keys, find_duplicate_groups, normalize_title
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 class MediaBase(BaseModel):
@@ -23,31 +27,75 @@ class Media(MediaBase):
     id: int
     status: str  # e.g., "reading", "watching", "completed", "on-hold"
     progress: int = 0  # chapters or episodes
+    latest_release: Optional[int] = None  # latest episode/chapter out, from the release poller
+    new_release: bool = False  # in progress and behind latest_release
 
 
 class MediaCreate(MediaBase):
     status: str = "planning"
     progress: int = 0
+    anilist_id: Optional[int] = None  # lets the release poller watch the item without a catalog match
 
 
 class MediaUpdate(BaseModel):
     status: Optional[str] = None
     progress: Optional[int] = None
 
+
+# Columns that make up a Media response. Handlers below return ORJSONResponse directly,
+# which skips FastAPI's response_model re-validation; response_model still documents the shape.
+MEDIA_COLUMNS = (
+    LibraryItem.id,
+    LibraryItem.title,
+    LibraryItem.type,
+    LibraryItem.source,
+    LibraryItem.cover_url,
+    LibraryItem.status,
+    LibraryItem.progress,
+    LibraryItem.latest_release,
+    LibraryItem.new_release,
+)
+
+
+def media_rows(session: Session, user_id: int, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+    """Fetch a user's library as plain dicts shaped like Media, without building ORM objects.
+
+    Rows are ordered by id so ``limit``/``offset`` pages are stable.
+    """
+    stmt = select(*MEDIA_COLUMNS).where(LibraryItem.user_id == user_id).order_by(LibraryItem.id)
+    if limit is not None:
+        stmt = stmt.offset(offset).limit(limit)
+    rows = session.exec(stmt).all()
+    return [row._asdict() for row in rows]
+
+
+def media_dict(rec: LibraryItem) -> Dict[str, Any]:
+    return {
+        "id": rec.id,
+        "title": rec.title,
+        "type": rec.type,
+        "source": rec.source,
+        "cover_url": rec.cover_url,
+        "status": rec.status,
+        "progress": rec.progress,
+        "latest_release": rec.latest_release,
+        "new_release": rec.new_release,
+    }
+
 def get_or_create_db_user(session: Session, username: str) -> UserModel:
     db_user = session.exec(select(UserModel).where(UserModel.username == username)).first()
     if db_user:
         return db_user
     # Auto-provision demo user into DB so choices persist across restarts
     if username == "demo":
-        user = UserModel(username="demo", full_name="Demo User", hashed_password=pwd_context.hash("demo1234"))
+        user = UserModel(username="demo", full_name="Demo User", hashed_password=hash_password("demo1234"))
         session.add(user)
         session.commit()
         session.refresh(user)
         return user
     # For safety, return a user record for any authenticated username (should be registered already)
     # This path should rarely occur because non-demo users are expected to register first.
-    user = UserModel(username=username, full_name=None, hashed_password=pwd_context.hash("!placeholder!"))
+    user = UserModel(username=username, full_name=None, hashed_password=hash_password("!placeholder!"))
     session.add(user)
     session.commit()
     session.refresh(user)
@@ -56,24 +104,19 @@ def get_or_create_db_user(session: Session, username: str) -> UserModel:
 
 @router.get("/items", response_model=List[Media])
 async def list_items(
-    current_user: User = Depends(get_current_user), session: Session = Depends(get_session)
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit to return the whole library"),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
 ):
     db_user = get_or_create_db_user(session, current_user.username)
-    items = session.exec(select(LibraryItem).where(LibraryItem.user_id == db_user.id)).all()
-    result: List[Media] = []
-    for i in items:
-        assert i.id is not None
-        result.append(
-        Media(
-            id=i.id,
-            title=i.title,
-            type=i.type,
-            source=i.source,
-            cover_url=i.cover_url,
-            status=i.status,
-            progress=i.progress,
-        ))
-    return result
+    assert db_user.id is not None
+    if limit is None:
+        return ORJSONResponse(media_rows(session, db_user.id))
+    # Paged mode (used by the virtualized frontend list): total goes in a header so the body
+    # keeps the same shape as the unpaged response
+    total = session.exec(select(func.count()).select_from(LibraryItem).where(LibraryItem.user_id == db_user.id)).one()
+    return ORJSONResponse(media_rows(session, db_user.id, limit, offset), headers={"X-Total-Count": str(total)})
 
 
 @router.post("/items", response_model=Media)
@@ -82,20 +125,16 @@ async def add_item(
 ):
     db_user = get_or_create_db_user(session, current_user.username)
     assert db_user.id is not None
-    rec = LibraryItem(user_id=db_user.id, **item.model_dump())
+    rec = LibraryItem(user_id=db_user.id, title_key=normalize_title(item.title), **item.model_dump())
     session.add(rec)
+    session.flush()
+    assert rec.id is not None
+    index_items(session, [rec])
+    progress_log.record(session, [progress_log.event(db_user.id, rec.id, rec.type, "add", rec.progress, rec.status)])
     session.commit()
     session.refresh(rec)
     assert rec.id is not None
-    return Media(
-        id=rec.id,
-        title=rec.title,
-        type=rec.type,
-        source=rec.source,
-        cover_url=rec.cover_url,
-        status=rec.status,
-        progress=rec.progress,
-    )
+    return ORJSONResponse(media_dict(rec))
 
 
 @router.get("/items/{item_id}", response_model=Media)
@@ -107,15 +146,7 @@ async def get_item(
     if not rec or rec.user_id != db_user.id:
         raise HTTPException(status_code=404, detail="Item not found")
     assert rec.id is not None
-    return Media(
-        id=rec.id,
-        title=rec.title,
-        type=rec.type,
-        source=rec.source,
-        cover_url=rec.cover_url,
-        status=rec.status,
-        progress=rec.progress,
-    )
+    return ORJSONResponse(media_dict(rec))
 
 
 @router.patch("/items/{item_id}", response_model=Media)
@@ -130,6 +161,7 @@ async def update_item(
     if not rec or rec.user_id != db_user.id:
         raise HTTPException(status_code=404, detail="Item not found")
     data = update.model_dump(exclude_unset=True)
+    old_progress, old_status = rec.progress, rec.status
     if data.get("status") is not None:
         rec.status = data["status"]
     if data.get("progress") is not None:
@@ -137,19 +169,17 @@ async def update_item(
     # touch updated_at
     from datetime import datetime, timezone
     rec.updated_at = datetime.now(timezone.utc)
+    rec.new_release = rec.status in IN_PROGRESS and rec.latest_release is not None and rec.progress < rec.latest_release
     session.add(rec)
+    if (rec.progress, rec.status) != (old_progress, old_status):
+        assert rec.id is not None
+        progress_log.record(session, [progress_log.event(
+            rec.user_id, rec.id, rec.type, "update", rec.progress, rec.status, old_progress, old_status, rec.updated_at
+        )])
     session.commit()
     session.refresh(rec)
     assert rec.id is not None
-    return Media(
-        id=rec.id,
-        title=rec.title,
-        type=rec.type,
-        source=rec.source,
-        cover_url=rec.cover_url,
-        status=rec.status,
-        progress=rec.progress,
-    )
+    return ORJSONResponse(media_dict(rec))
 
 
 @router.delete("/items/{item_id}")
@@ -159,11 +189,103 @@ async def delete_item(
     db_user = get_or_create_db_user(session, current_user.username)
     rec = session.get(LibraryItem, item_id)
     if rec and rec.user_id == db_user.id:
+        assert rec.id is not None
+        unindex_item(session, rec.id)
         session.delete(rec)
         session.commit()
     return {"ok": True}
 
 
+class DuplicateGroup(BaseModel):
+    type: str
+    title_key: str
+    items: List[Media]
+
+
+@router.get("/duplicates", response_model=List[DuplicateGroup])
+async def duplicates(
+    threshold: float = Query(0.6, gt=0.0, le=1.0, description="Trigram similarity; 1.0 = same normalized title only"),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """Items in the library that look like the same title (case, punctuation, season spelling, typos)."""
+    db_user = get_or_create_db_user(session, current_user.username)
+    assert db_user.id is not None
+    ensure_keys(session, db_user.id)
+    groups = find_duplicate_groups(session, db_user.id, threshold)
+    wanted = {i for g in groups for i in g["item_ids"]}  # type: ignore[attr-defined]
+    by_id: Dict[int, Dict[str, Any]] = {}
+    if wanted:
+        rows = session.exec(select(*MEDIA_COLUMNS).where(LibraryItem.id.in_(wanted))).all()  # type: ignore[union-attr]
+        by_id = {row.id: row._asdict() for row in rows}
+    return ORJSONResponse([
+        {"type": g["type"], "title_key": g["title_key"], "items": [by_id[i] for i in g["item_ids"]]}  # type: ignore[attr-defined]
+        for g in groups
+    ])
+
+
+@router.get("/export")
+async def export_library(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """Stream the whole library as NDJSON (one object per line) or CSV with a header row."""
+    db_user = get_or_create_db_user(session, current_user.username)
+    assert db_user.id is not None
+    return StreamingResponse(
+        transfer.export_chunks(db_user.id, format),
+        media_type=transfer.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="library.{format}"'},
+    )
+
+
+class ImportResult(BaseModel):
+    imported: int
+    skipped: int
+    failed: int
+    errors: List[str]
+
+
+@router.post("/import", response_model=ImportResult)
+async def import_library(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="Defaults from Content-Type"),
+    skip_duplicates: bool = True,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """Import an export file sent as the raw request body, parsed and written incrementally.
+
+    Rows failing validation are counted and reported (first few) instead of aborting the
+    import; batches already written stay committed.
+    """
+    fmt = format or transfer.format_for(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=")
+    db_user = get_or_create_db_user(session, current_user.username)
+    assert db_user.id is not None
+    # Release this request's connection; the import writes from its own thread-owned sessions
+    session.close()
+    result = await transfer.import_stream(db_user.id, request.stream(), fmt, skip_duplicates)
+    return ORJSONResponse(result)
+
+
+@router.get("/stats")
+async def stats(
+    days: int = Query(30, ge=1, le=366),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """Activity over the last ``days`` days: episodes/chapters advanced, updates, additions, completions.
+
+    Served from the DailyProgress rollups, so cost depends on ``days``, not history size.
+    """
+    db_user = get_or_create_db_user(session, current_user.username)
+    assert db_user.id is not None
+    return ORJSONResponse(progress_log.stats(session, db_user.id, days))
+
+
 @router.get("/summary")
 async def summary(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)) -> dict[str, object]:
     db_user = get_or_create_db_user(session, current_user.username)
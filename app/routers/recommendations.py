@@ -0,0 +1,53 @@
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..db import get_session
+from ..models import CatalogEntry, LibraryItem
+from ..services.titles import MISSING_KEYS, ensure_keys
+from .auth import get_current_user, User
+from .library import get_or_create_db_user
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+@router.get("")
+async def recommendations(
+    type: Optional[Literal["anime", "manga"]] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """What to watch/read next, from titles that co-occur with this user's library elsewhere.
+
+    Served from the precomputed model (``python -m app.services.recommendations``); an
+    empty list until the job has run.
+    """
+    # NumPy/SciPy load on first use rather than at worker startup
+    from ..services.recommendations import get_model
+
+    model = get_model(settings.recommendations_dir)
+    if model is None:
+        return ORJSONResponse({"built_at": None, "items": []})
+    db_user = get_or_create_db_user(session, current_user.username)
+    assert db_user.id is not None
+    ensure_keys(session, db_user.id)
+    owned = session.exec(
+        select(LibraryItem.type, LibraryItem.title_key).where(LibraryItem.user_id == db_user.id)
+    ).all()
+    items: List[Dict[str, Any]] = model.recommend(((t, k) for t, k in owned if k not in MISSING_KEYS), limit, type)
+    if items:
+        # Covers and totals from the local catalog cache, when AniList data has been seen
+        keys = {i["title_key"] for i in items}
+        catalog = {
+            (c.type, c.title_key): c
+            for c in session.exec(select(CatalogEntry).where(CatalogEntry.title_key.in_(keys))).all()  # type: ignore[attr-defined]
+        }
+        for i in items:
+            c = catalog.get((i["type"], i["title_key"]))
+            i["cover_url"] = c.cover_url if c else None
+            i["anilist_id"] = c.anilist_id if c else None
+    return ORJSONResponse({"built_at": model.meta["built_at"], "items": items})
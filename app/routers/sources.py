@@ -1,9 +1,14 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
+from sqlmodel import Session
 
+from ..admission import charge, retry_after
+from ..db import get_session
+from ..services import catalog
 from ..services.anilist import search_titles
+from ..services.titles import best_match, normalize_title
 from .auth import get_current_user, User
 
 router = APIRouter()
@@ -61,11 +66,28 @@ async def autocomplete(q: str, type: Optional[str] = "manga", current_user: User
 
 
 @router.get("/max")
-async def get_max(q: str, type: Optional[str] = "manga", current_user: User = Depends(get_current_user)):
+async def get_max(
+    request: Request,
+    q: str,
+    type: Optional[str] = "manga",
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
     media_type = "manga" if type not in ("anime", "manga") else type
-    results = await search_titles(query_text=q, media_type=media_type, per_page=1)
+    # Indexed lookup by normalized title first; AniList only on a catalog miss
+    entry = catalog.lookup(session, media_type, q)
+    if entry is not None:
+        return {"max": entry.episodes if media_type == "anime" else entry.chapters}
+    # Admitted as a cheap read; only a catalog miss spends the caller's upstream budget
+    wait = charge(request.scope, "upstream")
+    if wait > 0:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded for upstream requests", headers={"Retry-After": retry_after(wait)})
+    results = await search_titles(query_text=q, media_type=media_type, per_page=5)
     if not results:
         return {"max": None}
-    r = results[0]
+    catalog.remember(session, media_type, results)
+    session.commit()
+    # Pick the hit whose title (any language) is closest to the query, not blindly the first
+    r = results[best_match(normalize_title(q), [tuple(x.get("titles") or [x["title"]]) for x in results])]
     max_val = r.get("episodes") if media_type == "anime" else r.get("chapters")
     return {"max": max_val}
@@ -0,0 +1,17 @@
+from typing import Literal
+
+from fastapi import APIRouter, Response
+
+from ..services.trending import trending_snapshot
+
+router = APIRouter()
+
+
+@router.get("/{media_type}")
+async def trending(media_type: Literal["anime", "manga"]) -> Response:
+    """Landing feed of trending titles.
+
+    Public and served from the in-memory snapshot only; AniList is never called per request.
+    """
+    feed = trending_snapshot.get(media_type)
+    return Response(content=feed.body, media_type="application/json", headers={"Cache-Control": "public, max-age=60"})
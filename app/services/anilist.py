@@ -1,13 +1,15 @@
 from __future__ import annotations
 from typing import List, Literal, Dict, Any
-import httpx
 
-ANILIST_URL = "https://graphql.anilist.co"
+from ..config import settings
+
+ANILIST_URL = settings.anilist_graphql_url
 
 Suggestion = Dict[str, Any]
 
 
-async def fetch_suggestions(media_type: Literal["anime", "manga"] = "anime", per_page: int = 10) -> List[Suggestion]:
+async def fetch_trending(media_type: Literal["anime", "manga"] = "anime", per_page: int = 10) -> List[Suggestion]:
+    """Trending titles from AniList. Raises on upstream/network errors (see fetch_suggestions)."""
     query = (
         "query ($type: MediaType, $perPage: Int) {\n"
         "  Page(perPage: $perPage) {\n"
@@ -22,33 +24,38 @@ async def fetch_suggestions(media_type: Literal["anime", "manga"] = "anime", per
     )
     variables: Dict[str, Any] = {
         "type": "ANIME" if media_type == "anime" else "MANGA",
-        "perPage": max(1, min(per_page, 20)),
+        "perPage": max(1, min(per_page, 50)),
     }
+    import httpx  # deferred: keeps worker import time down
+    async with httpx.AsyncClient(timeout=8.0) as client:
+        resp = await client.post(ANILIST_URL, json={"query": query, "variables": variables})
+        resp.raise_for_status()
+        data = resp.json()
+    items = data.get("data", {}).get("Page", {}).get("media", [])
+    results: List[Suggestion] = []
+    for m in items:
+        title_obj: Dict[str, Any] = m.get("title") or {}
+        title = (
+            title_obj.get("romaji")
+            or title_obj.get("english")
+            or title_obj.get("native")
+            or "Untitled"
+        )
+        cover_obj: Dict[str, Any] = m.get("coverImage") or {}
+        results.append(
+            {
+                "id": str(m.get("id")),
+                "title": title,
+                "type": media_type,
+                "cover_url": cover_obj.get("large"),
+            }
+        )
+    return results
+
+
+async def fetch_suggestions(media_type: Literal["anime", "manga"] = "anime", per_page: int = 10) -> List[Suggestion]:
     try:
-        async with httpx.AsyncClient(timeout=8.0) as client:
-            resp = await client.post(ANILIST_URL, json={"query": query, "variables": variables})
-            resp.raise_for_status()
-            data = resp.json()
-            items = data.get("data", {}).get("Page", {}).get("media", [])
-            results: List[Suggestion] = []
-            for m in items:
-                title_obj: Dict[str, Any] = m.get("title") or {}
-                title = (
-                    title_obj.get("romaji")
-                    or title_obj.get("english")
-                    or title_obj.get("native")
-                    or "Untitled"
-                )
-                cover_obj: Dict[str, Any] = m.get("coverImage") or {}
-                results.append(
-                    {
-                        "id": str(m.get("id")),
-                        "title": title,
-                        "type": media_type,
-                        "cover_url": cover_obj.get("large"),
-                    }
-                )
-            return results
+        return await fetch_trending(media_type, per_page=min(per_page, 20))
     except Exception:
         # Graceful fallback
         return [{"id": "0", "title": f"Trending {media_type.title()} #1", "type": media_type, "cover_url": None}]
@@ -76,6 +83,7 @@ async def search_titles(query_text: str, media_type: Literal["anime", "manga"] =
         "type": "ANIME" if media_type == "anime" else "MANGA",
         "perPage": max(1, min(per_page, 20)),
     }
+    import httpx  # deferred: keeps worker import time down
     try:
         async with httpx.AsyncClient(timeout=8.0, headers={"Accept": "application/json", "User-Agent": "anime-tracker/0.1"}) as client:
             resp = await client.post(ANILIST_URL, json={"query": gql, "variables": variables})
@@ -99,8 +107,38 @@ async def search_titles(query_text: str, media_type: Literal["anime", "manga"] =
                     "cover_url": cover.get("medium") or cover.get("large"),
                     "chapters": m.get("chapters"),
                     "episodes": m.get("episodes"),
+                    # all languages, for catalog matching (app/services/catalog.py)
+                    "titles": [t for t in (title_obj.get("english"), title_obj.get("romaji"), title_obj.get("native")) if t],
                 })
             return out
     except Exception:
         # Fallback: simple echo to ensure UI isn't empty
         return [{"id": "0", "title": query_text, "type": media_type, "cover_url": None, "chapters": None, "episodes": None}]
+
+
+async def fetch_media_status(ids: List[int]) -> List[Dict[str, Any]]:
+    """Release status for up to 50 media ids in one query. Raises on upstream/network errors.
+
+    Media AniList no longer knows are simply missing from the result.
+    """
+    gql = (
+        "query ($ids: [Int], $perPage: Int) {\n"
+        "  Page(perPage: $perPage) {\n"
+        "    media(id_in: $ids) {\n"
+        "      id\n"
+        "      type\n"
+        "      status\n"
+        "      episodes\n"
+        "      chapters\n"
+        "      nextAiringEpisode { episode airingAt }\n"
+        "    }\n"
+        "  }\n"
+        "}"
+    )
+    variables: Dict[str, Any] = {"ids": list(ids), "perPage": max(1, min(len(ids), 50))}
+    import httpx  # deferred: keeps worker import time down
+    async with httpx.AsyncClient(timeout=15.0) as client:
+        resp = await client.post(ANILIST_URL, json={"query": gql, "variables": variables})
+        resp.raise_for_status()
+        data = resp.json()
+    return list(data.get("data", {}).get("Page", {}).get("media", []) or [])
@@ -7,7 +7,7 @@ from ..config import settings
 
 OAUTH_AUTHORIZE_URL = "https://anilist.co/api/v2/oauth/authorize"
 OAUTH_TOKEN_URL = "https://anilist.co/api/v2/oauth/token"
-GRAPHQL_URL = "https://graphql.anilist.co"
+GRAPHQL_URL = settings.anilist_graphql_url
 
 
 def get_authorize_url(state: str) -> str:
@@ -60,6 +60,8 @@ async def fetch_user_lists(access_token: str, media_type: str = "ANIME") -> List
         type
         coverImage { large medium }
         siteUrl
+        episodes
+        chapters
       }
       }
     }
@@ -0,0 +1,82 @@
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import insert, update
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..db import dialect_insert
+from ..models import CatalogEntry
+from .titles import normalize_title
+
+# Columns refreshed when a title is seen again
+UPSERT_FIELDS = ("anilist_id", "title", "cover_url", "episodes", "chapters", "fetched_at")
+
+
+def lookup(session: Session, media_type: str, title: str) -> Optional[CatalogEntry]:
+    """Fresh catalog entry whose normalized title (any language) equals ``title``'s key."""
+    entry = session.exec(
+        select(CatalogEntry).where(
+            (CatalogEntry.type == media_type) & (CatalogEntry.title_key == normalize_title(title))
+        )
+    ).first()
+    if entry is None:
+        return None
+    fetched_at = entry.fetched_at if entry.fetched_at.tzinfo else entry.fetched_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - fetched_at > timedelta(hours=settings.catalog_ttl_hours):
+        return None
+    return entry
+
+
+def remember(session: Session, media_type: str, results: Iterable[Dict[str, Any]]) -> None:
+    """Upsert AniList media into the catalog, one row per distinct normalized title.
+
+    ``results`` use the search_titles shape; ``titles`` holds the alternative titles.
+    Uses INSERT ... ON CONFLICT (type, title_key) DO UPDATE, so concurrent misses on the
+    same title from several requests or workers don't collide. Caller commits.
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    for r in results:
+        if not r.get("id") or r["id"] == "0":
+            continue  # search_titles' offline fallback, not a real media entry
+        for t in r.get("titles") or [r.get("title")]:
+            if t:
+                rows.setdefault(normalize_title(t), r)
+    if not rows:
+        return
+    now = datetime.now(timezone.utc)
+    values = [
+        {
+            "anilist_id": int(r["id"]),
+            "type": media_type,
+            "title_key": key,
+            "title": r["title"],
+            "cover_url": r.get("cover_url"),
+            "episodes": r.get("episodes"),
+            "chapters": r.get("chapters"),
+            "fetched_at": now,
+        }
+        for key, r in rows.items()
+    ]
+    table = CatalogEntry.__table__  # type: ignore[attr-defined]
+    conn = session.connection()
+    upsert = dialect_insert(conn.dialect.name)
+    if upsert is not None:
+        stmt = upsert(table)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["type", "title_key"],
+                set_={f: stmt.excluded[f] for f in UPSERT_FIELDS},
+            ),
+            values,
+        )
+        return
+    for v in values:
+        result = conn.execute(
+            update(table)
+            .where(table.c.type == media_type, table.c.title_key == v["title_key"])
+            .values({f: v[f] for f in UPSERT_FIELDS})
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(table).values(v))
@@ -0,0 +1,60 @@
+"""Database leases that elect one worker to run each background job.
+
+Every uvicorn worker starts the same lifespan tasks. Jobs that call upstream (the trending
+refresh, the release poller) take a named lease first, so only one worker does the work
+while the others skip their turn. The holder renews the lease each cycle; if it dies, the
+lease expires after ``ttl`` seconds and another worker takes over.
+"""
+from __future__ import annotations
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from ..db import dialect_insert, get_engine
+from ..models import Lease
+
+
+def new_holder() -> str:
+    """Identity for one lease-taking job instance (unique even within a process)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire(name: str, holder: str, ttl: float, now: Optional[datetime] = None) -> bool:
+    """Take or renew lease ``name`` for ``ttl`` seconds; False while someone else holds it."""
+    now = now or datetime.now(timezone.utc)
+    values = {"holder": holder, "expires_at": now + timedelta(seconds=ttl)}
+    table = Lease.__table__  # type: ignore[attr-defined]
+    with Session(get_engine()) as session:
+        conn = session.connection()
+        # Single statements, so two workers racing for an expired lease can't both win
+        taken = conn.execute(
+            update(table)
+            .where(table.c.name == name, or_(table.c.holder == holder, table.c.expires_at <= now))
+            .values(values)
+        ).rowcount
+        if not taken:
+            upsert = dialect_insert(conn.dialect.name)
+            if upsert is not None:
+                taken = conn.execute(upsert(table).values(name=name, **values).on_conflict_do_nothing(index_elements=["name"])).rowcount
+            else:
+                try:
+                    with conn.begin_nested():
+                        taken = conn.execute(insert(table).values(name=name, **values)).rowcount
+                except IntegrityError:
+                    taken = 0
+        session.commit()
+    return taken == 1
+
+
+def release(name: str, holder: str) -> None:
+    """Give the lease up early (on shutdown) so another worker can take over right away."""
+    table = Lease.__table__  # type: ignore[attr-defined]
+    with Session(get_engine()) as session:
+        session.connection().execute(delete(table).where(table.c.name == name, table.c.holder == holder))
+        session.commit()
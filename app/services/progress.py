@@ -0,0 +1,112 @@
+"""Progress history: append-only events plus incrementally maintained daily rollups.
+
+Every write path that changes progress or status calls :func:`record` in the same
+transaction as the change. Stats read only ``DailyProgress``, so their cost grows with the
+number of days asked for, not with the number of events.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlmodel import Session, select
+
+from ..db import dialect_insert
+from ..models import DailyProgress, ProgressEvent
+
+ROLLUP_FIELDS = ("units", "updates", "added", "completed")
+
+
+def event(
+    user_id: int,
+    item_id: int,
+    media_type: str,
+    kind: str,
+    new_progress: int,
+    new_status: str,
+    old_progress: Optional[int] = None,
+    old_status: Optional[str] = None,
+    occurred_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Build a ProgressEvent row (a plain dict, so batches can go through executemany)."""
+    return {
+        "user_id": user_id,
+        "item_id": item_id,
+        "type": media_type,
+        "kind": kind,
+        "old_progress": old_progress,
+        "new_progress": new_progress,
+        "old_status": old_status,
+        "new_status": new_status,
+        "occurred_at": occurred_at or datetime.now(timezone.utc),
+    }
+
+
+def _contribution(ev: Dict[str, Any]) -> Dict[str, int]:
+    if ev["kind"] == "update":
+        delta = ev["new_progress"] - (ev["old_progress"] or 0)
+        completed = ev["new_status"] == "completed" and ev["old_status"] != "completed"
+        return {"units": max(delta, 0), "updates": 1, "added": 0, "completed": int(completed)}
+    # Adds/imports carry over progress made elsewhere; it isn't activity on this day
+    return {"units": 0, "updates": 0, "added": 1, "completed": 0}
+
+
+def record(session: Session, events: Iterable[Dict[str, Any]]) -> None:
+    """Append ``events`` and fold them into the daily rollups. Caller commits.
+
+    One executemany for the events, then one upsert per touched (user, day, type), so a
+    single progress change costs two statements regardless of history size.
+    """
+    rows = list(events)
+    if not rows:
+        return
+    conn = session.connection()
+    conn.execute(insert(ProgressEvent), rows)
+
+    totals: Dict[Tuple[int, date, str], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    for ev in rows:
+        key = (ev["user_id"], ev["occurred_at"].astimezone(timezone.utc).date(), ev["type"])
+        for field, value in _contribution(ev).items():
+            totals[key][field] += value
+
+    table = DailyProgress.__table__  # type: ignore[attr-defined]
+    upsert = dialect_insert(conn.dialect.name)
+    for (user_id, day, media_type), inc in totals.items():
+        increment = {f: table.c[f] + inc[f] for f in ROLLUP_FIELDS}
+        if upsert is not None:
+            stmt = upsert(table).values(user_id=user_id, day=day, type=media_type, **inc)
+            conn.execute(stmt.on_conflict_do_update(index_elements=["user_id", "day", "type"], set_=increment))
+            continue
+        result = conn.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.day == day, table.c.type == media_type)
+            .values(increment)
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(table).values(user_id=user_id, day=day, type=media_type, **inc))
+
+
+def stats(session: Session, user_id: int, days: int) -> Dict[str, Any]:
+    """Totals, daily series and pace for the last ``days`` days (today included), from rollups only."""
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    rollups = session.exec(
+        select(DailyProgress)
+        .where(DailyProgress.user_id == user_id, DailyProgress.day >= since)
+        .order_by(DailyProgress.day, DailyProgress.type)  # type: ignore[arg-type]
+    ).all()
+    totals: Dict[str, Dict[str, int]] = {}
+    daily: List[Dict[str, Any]] = []
+    for r in rollups:
+        values = {f: getattr(r, f) for f in ROLLUP_FIELDS}
+        daily.append({"day": r.day.isoformat(), "type": r.type, **values})
+        t = totals.setdefault(r.type, dict.fromkeys(ROLLUP_FIELDS, 0))
+        for f in ROLLUP_FIELDS:
+            t[f] += values[f]
+    return {
+        "since": since.isoformat(),
+        "days": days,
+        "totals": totals,
+        "per_day": {t: round(v["units"] / days, 2) for t, v in totals.items()},
+        "daily": daily,
+    }
@@ -0,0 +1,326 @@
+"""Item-to-item recommendations from co-occurrence across all users' libraries.
+
+An offline batch job (``python -m app.services.recommendations``, e.g. from cron) turns
+libraries into a users x items binary matrix ``X`` and keeps the co-occurrence matrix
+``C = X.T @ X`` up to date incrementally. Only users whose library changed since the last
+run (detected by a per-user fingerprint query) are re-read, and their old rows are
+subtracted from ``C`` and their new rows added. Items are identified by ``(type,
+title_key)``, so the same title tracked by different users under different spellings still
+lines up.
+
+The published model holds the top ``k`` cosine neighbours per item as a CSR triple of
+``.npy`` files, which the API memory-maps. A request is then a handful of slices and a
+``bincount``, with no database scans beyond the user's own items and no upstream calls.
+
+This module imports NumPy/SciPy at import time; the API imports it lazily.
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import case
+from sqlmodel import Session, func, select
+
+from ..config import settings
+from ..models import LibraryItem
+from .titles import MISSING_KEYS
+
+STATE_FILE = "state.npz"
+META_FILE = "meta.json"
+KEEP_VERSIONS = 2  # the one meta.json names plus the one before it, which readers may still be loading
+USER_CHUNK = 500
+MEDIA_TYPES = ("anime", "manga")
+
+ItemKey = Tuple[str, str]  # (type, title_key)
+
+logger = logging.getLogger(__name__)
+
+
+# --- batch job ----------------------------------------------------------------------------
+
+@dataclass
+class BuildState:
+    """What the job needs to apply the next increment; kept next to the published model."""
+    items: List[ItemKey]
+    titles: List[str]
+    user_ids: np.ndarray  # row order of X
+    fingerprints: Dict[int, Tuple[int, int, str, int]]
+    X: sp.csr_matrix  # users x items, binary
+    C: sp.csr_matrix  # items x items co-occurrence; diagonal = number of users per item
+
+    @classmethod
+    def empty(cls) -> "BuildState":
+        return cls([], [], np.zeros(0, dtype=np.int64), {}, sp.csr_matrix((0, 0), dtype=np.int32), sp.csr_matrix((0, 0), dtype=np.int32))
+
+
+def _save_state(path: str, state: BuildState) -> None:
+    # Vocabulary and fingerprints go in as one JSON string so loading needs no pickle.
+    # Uncompressed: zlib was over half of an incremental run
+    vocab = {
+        "items": [list(k) for k in state.items],
+        "titles": state.titles,
+        "fingerprints": [[u, *fp] for u, fp in state.fingerprints.items()],
+    }
+    np.savez(
+        path,
+        vocab=np.array(json.dumps(vocab)),
+        user_ids=state.user_ids,
+        X_indptr=state.X.indptr, X_indices=state.X.indices, X_shape=np.array(state.X.shape),
+        C_indptr=state.C.indptr, C_indices=state.C.indices, C_data=state.C.data, C_shape=np.array(state.C.shape),
+    )
+
+
+def _load_state(path: str) -> Optional[BuildState]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        vocab = json.loads(str(z["vocab"]))
+        X = sp.csr_matrix(
+            (np.ones(len(z["X_indices"]), dtype=np.int32), z["X_indices"], z["X_indptr"]), shape=tuple(z["X_shape"])
+        )
+        C = sp.csr_matrix((z["C_data"], z["C_indices"], z["C_indptr"]), shape=tuple(z["C_shape"]))
+        return BuildState(
+            items=[(t, key) for t, key in vocab["items"]],
+            titles=vocab["titles"],
+            user_ids=z["user_ids"],
+            # A fingerprint from an older format compares unequal, so that user is re-read
+            fingerprints={int(u): tuple(fp) for u, *fp in vocab["fingerprints"]},  # type: ignore[misc]
+            X=X,
+            C=C,
+        )
+
+
+def _fingerprints(session: Session) -> Dict[int, Tuple[int, int, str, int]]:
+    """(count, sum of ids, newest created_at, un-keyed items) per user.
+
+    Changes whenever an item is added or removed, and when the title_key backfill (migrate
+    or first use) keys items that were skipped before.
+    """
+    unkeyed = func.sum(case((LibraryItem.title_key == "", 1), else_=0))
+    rows = session.exec(
+        select(LibraryItem.user_id, func.count(), func.sum(LibraryItem.id), func.max(LibraryItem.created_at), unkeyed)
+        .group_by(LibraryItem.user_id)
+    ).all()
+    return {int(u): (int(n), int(s or 0), str(m), int(k or 0)) for u, n, s, m, k in rows}
+
+
+def _user_rows(session: Session, user_ids: Sequence[int]) -> Iterable[Tuple[int, str, str, str]]:
+    for start in range(0, len(user_ids), USER_CHUNK):
+        chunk = list(user_ids[start:start + USER_CHUNK])
+        yield from session.exec(
+            select(LibraryItem.user_id, LibraryItem.type, LibraryItem.title_key, LibraryItem.title)
+            .where(LibraryItem.user_id.in_(chunk))  # type: ignore[attr-defined]
+        ).all()
+
+
+def _resize(m: sp.csr_matrix, shape: Tuple[int, int]) -> sp.csr_matrix:
+    m = m.copy()
+    m.resize(shape)
+    return m.tocsr()
+
+
+def update_state(session: Session, state: BuildState) -> Tuple[BuildState, int]:
+    """Apply library changes since ``state``; returns the new state and the number of changed users."""
+    current = _fingerprints(session)
+    changed = sorted(u for u in set(current) | set(state.fingerprints) if current.get(u) != state.fingerprints.get(u))
+    if not changed:
+        return state, 0
+
+    index: Dict[ItemKey, int] = {k: i for i, k in enumerate(state.items)}
+    items, titles = list(state.items), list(state.titles)
+    new_rows: Dict[int, set] = {u: set() for u in changed if u in current}
+    for user_id, media_type, key, title in _user_rows(session, list(new_rows)):
+        if key in MISSING_KEYS:
+            continue  # not a title: would tie every un-keyed item together as one hub
+        item = (media_type, key)
+        if item not in index:
+            index[item] = len(items)
+            items.append(item)
+            titles.append(title)
+        new_rows[user_id].add(index[item])
+
+    n = len(items)
+    changed_set = set(changed)
+    keep = np.array([int(u) not in changed_set for u in state.user_ids], dtype=bool)
+    X_old = _resize(state.X, (state.X.shape[0], n))
+    X_removed = X_old[~keep]
+
+    new_ids = np.array(list(new_rows), dtype=np.int64)
+    indptr = np.zeros(len(new_ids) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(new_rows[int(u)]) for u in new_ids])
+    indices = np.fromiter((i for u in new_ids for i in sorted(new_rows[int(u)])), dtype=np.int32, count=int(indptr[-1]))
+    X_added = sp.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(len(new_ids), n))
+
+    C = _resize(state.C, (n, n)) - (X_removed.T @ X_removed) + (X_added.T @ X_added)
+    C = C.tocsr()
+    C.eliminate_zeros()
+    X = sp.vstack([X_old[keep], X_added], format="csr")
+    return BuildState(items, titles, np.concatenate([state.user_ids[keep], new_ids]), current, X, C), len(changed)
+
+
+def top_neighbours(C: sp.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Top-k cosine neighbours per item from co-occurrence, as CSR (indptr, indices, scores)."""
+    C = C.tocsr()
+    n = C.shape[0]
+    df = C.diagonal().astype(np.float64)
+    rows = np.repeat(np.arange(n), np.diff(C.indptr))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = C.data / np.sqrt(df[rows] * df[C.indices])
+    mask = (rows != C.indices) & np.isfinite(scores) & (scores > 0)
+    rows, cols, scores = rows[mask], C.indices[mask], scores[mask]
+
+    # Sort by (row, score desc) once, then keep each row's first k entries: no per-item loop
+    order = np.lexsort((-scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    counts = np.bincount(rows, minlength=n)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]) if n else np.zeros(0, dtype=np.int64)
+    keep = (np.arange(len(rows)) - starts[rows]) < k
+    out_indptr = np.zeros(n + 1, dtype=np.int64)
+    out_indptr[1:] = np.cumsum(np.minimum(counts, k))
+    return out_indptr, cols[keep].astype(np.int32), scores[keep].astype(np.float32)
+
+
+def publish(out_dir: str, state: BuildState, k: int) -> Dict[str, Any]:
+    """Write a new model version next to the old one, then switch ``meta.json`` to it atomically."""
+    os.makedirs(out_dir, exist_ok=True)
+    version = time.time_ns()
+    indptr, indices, scores = top_neighbours(state.C, k)
+    types = np.array([MEDIA_TYPES.index(t) if t in MEDIA_TYPES else len(MEDIA_TYPES) for t, _ in state.items], dtype=np.int8)
+    for name, arr in (("indptr", indptr), ("indices", indices), ("scores", scores), ("types", types)):
+        np.save(os.path.join(out_dir, f"{version}.{name}.npy"), arr)
+    with open(os.path.join(out_dir, f"{version}.items.json"), "w", encoding="utf-8") as f:
+        json.dump([[t, key, title] for (t, key), title in zip(state.items, state.titles)], f)
+    meta = {
+        "version": version,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "users": len(state.user_ids),
+        "items": len(state.items),
+        "neighbours": int(indptr[-1]),
+    }
+    tmp = os.path.join(out_dir, META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(out_dir, META_FILE))
+    # A worker that read the previous meta.json may still be opening that version's files,
+    # so it stays; only older versions go (readers keep their already-open maps).
+    names = os.listdir(out_dir)
+    versions = sorted({int(n.split(".", 1)[0]) for n in names if n.split(".", 1)[0].isdigit()}, reverse=True)
+    stale = set(versions[KEEP_VERSIONS:])
+    for name in names:
+        head = name.split(".", 1)[0]
+        if head.isdigit() and int(head) in stale:
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except FileNotFoundError:
+                pass  # another build got there first
+    return meta
+
+
+def build(session: Session, out_dir: str, k: int, full: bool = False) -> Dict[str, Any]:
+    """Run one increment (or a full rebuild) and publish the model."""
+    state_path = os.path.join(out_dir, STATE_FILE)
+    state = (None if full else _load_state(state_path)) or BuildState.empty()
+    state, changed = update_state(session, state)
+    os.makedirs(out_dir, exist_ok=True)
+    _save_state(state_path, state)
+    meta = publish(out_dir, state, k)
+    return {**meta, "changed_users": changed}
+
+
+# --- serving ------------------------------------------------------------------------------
+
+class Model:
+    """A published model, memory-mapped; per-item lookups stay in the page cache."""
+
+    def __init__(self, out_dir: str, meta: Dict[str, Any]) -> None:
+        prefix = os.path.join(out_dir, str(meta["version"]))
+        self.meta = meta
+        self.indptr = np.load(f"{prefix}.indptr.npy", mmap_mode="r")
+        self.indices = np.load(f"{prefix}.indices.npy", mmap_mode="r")
+        self.scores = np.load(f"{prefix}.scores.npy", mmap_mode="r")
+        self.types = np.load(f"{prefix}.types.npy", mmap_mode="r")
+        with open(f"{prefix}.items.json", "r", encoding="utf-8") as f:
+            self.items: List[List[str]] = json.load(f)
+        self.index: Dict[ItemKey, int] = {(t, key): i for i, (t, key, _) in enumerate(self.items)}
+
+    def recommend(self, owned: Iterable[ItemKey], limit: int, media_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        own = np.array(sorted({self.index[k] for k in owned if k in self.index}), dtype=np.int64)
+        if not len(own):
+            return []
+        slices = [slice(self.indptr[i], self.indptr[i + 1]) for i in own]
+        neigh = np.concatenate([self.indices[s] for s in slices])
+        weights = np.concatenate([self.scores[s] for s in slices]).astype(np.float64)
+        if not len(neigh):
+            return []
+        totals = np.bincount(neigh, weights=weights, minlength=len(self.items))
+        totals[own] = 0
+        if media_type is not None:
+            totals[np.asarray(self.types) != MEDIA_TYPES.index(media_type)] = 0
+        candidates = np.flatnonzero(totals)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-totals[candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(-totals[candidates], kind="stable")]
+        return [
+            {"type": self.items[i][0], "title_key": self.items[i][1], "title": self.items[i][2], "score": round(float(totals[i]), 4)}
+            for i in candidates
+        ]
+
+
+_cache: Dict[str, Tuple[float, Optional[Model]]] = {}
+
+
+def get_model(out_dir: str) -> Optional[Model]:
+    """Current published model, reloaded when the batch job publishes a new version.
+
+    If the new version can't be loaded (files pruned by a later build mid-load, a partial
+    write), the last model that loaded keeps serving and the reload is retried next call.
+    """
+    meta_path = os.path.join(out_dir, META_FILE)
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _cache.get(out_dir)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            model = Model(out_dir, meta)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("could not load recommendations model from %s, keeping the previous one: %s", out_dir, e)
+            return cached[1] if cached is not None else None
+        cached = (mtime, model)
+        _cache[out_dir] = cached
+    return cached[1]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Update the recommendations model from library data.")
+    parser.add_argument("--full", action="store_true", help="rebuild from scratch instead of applying changes")
+    parser.add_argument("--out", default=settings.recommendations_dir)
+    parser.add_argument("-k", type=int, default=settings.recommendations_top_k, help="neighbours kept per item")
+    args = parser.parse_args(argv)
+
+    from ..db import get_engine
+
+    started = time.perf_counter()
+    with Session(get_engine()) as session:
+        result = build(session, args.out, args.k, full=args.full)
+    print(
+        f"recommendations v{result['version']}: {result['items']} items, {result['users']} users, "
+        f"{result['changed_users']} changed, {time.perf_counter() - started:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""New episode/chapter release polling, shared by all users.
+
+Users don't poll AniList individually. The poller keeps one ``ReleaseWatch`` row per
+distinct AniList media referenced by any in-progress library item, checks due rows in
+batches of up to 50 ids per GraphQL query, and when a media's latest release moves
+forward fans the news out to every affected item with a single UPDATE.
+
+Rows are rechecked on an adaptive schedule: airing shows right after their next episode
+airs, releasing manga every few hours, announced and paused titles daily or every few
+days, finished ones weekly.
+
+Every worker starts the poller, but only the holder of a database lease polls, so each
+due media is fetched once per cycle however many workers there are.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, exists, func, insert, literal, or_, update
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..db import get_engine
+from ..models import CatalogEntry, LibraryItem, ReleaseWatch
+from . import leases
+from .anilist import fetch_media_status
+
+logger = logging.getLogger(__name__)
+
+# Library statuses worth watching (the app's own plus AniList's lowercased list statuses)
+IN_PROGRESS: Tuple[str, ...] = ("watching", "reading", "current", "repeating")
+Fetcher = Callable[[List[int]], Awaitable[List[Dict[str, Any]]]]
+
+# AniList updates nextAiringEpisode shortly after broadcast; check a little after that
+AIRING_GRACE = timedelta(minutes=15)
+RECHECK: Dict[str, timedelta] = {
+    "RELEASING": timedelta(hours=6),
+    "NOT_YET_RELEASED": timedelta(days=1),
+    "HIATUS": timedelta(days=3),
+    "FINISHED": timedelta(days=7),
+    "CANCELLED": timedelta(days=30),
+}
+DEFAULT_RECHECK = timedelta(days=1)
+MISSING_RECHECK = timedelta(days=7)  # id unknown to AniList (deleted or merged media)
+
+
+def latest_release(media: Dict[str, Any]) -> Optional[int]:
+    """Latest episode/chapter out now, or None when AniList doesn't say.
+
+    Airing anime: the episode before ``nextAiringEpisode``. Otherwise the total count,
+    which AniList only fills in for most titles once they're finished.
+    """
+    upcoming = media.get("nextAiringEpisode") or {}
+    if upcoming.get("episode"):
+        return max(0, int(upcoming["episode"]) - 1)
+    count = media.get("chapters") if (media.get("type") or "").upper() == "MANGA" else media.get("episodes")
+    return int(count) if count else None
+
+
+def next_check(status: Optional[str], next_airing_at: Optional[datetime], now: datetime) -> datetime:
+    interval = RECHECK.get(status or "", DEFAULT_RECHECK)
+    if next_airing_at is not None and next_airing_at > now:
+        return min(next_airing_at + AIRING_GRACE, now + interval)
+    return now + interval
+
+
+class ReleasePoller:
+    def __init__(
+        self,
+        fetch: Fetcher = fetch_media_status,
+        batch_size: int = 50,
+        max_per_cycle: int = 2000,
+        pause: float = 1.0,
+        lease: str = "release-poller",
+        lease_ttl: float = 660.0,
+    ) -> None:
+        self._fetch = fetch
+        self.batch_size = max(1, min(batch_size, 50))  # AniList caps perPage at 50
+        self.max_per_cycle = max_per_cycle
+        self.pause = pause  # seconds between upstream queries, to stay under AniList's rate limit
+        self.lease = lease
+        self.lease_ttl = lease_ttl  # renewed every batch; a dead holder's turn passes on after this
+        self.holder = leases.new_holder()
+
+    def _hold_lease(self) -> bool:
+        return leases.acquire(self.lease, self.holder, self.lease_ttl)
+
+    def sync_watchlist(self, session: Session, now: datetime) -> None:
+        """Bring ReleaseWatch in line with the in-progress items, in a few set-based statements."""
+        in_progress = LibraryItem.status.in_(IN_PROGRESS)  # type: ignore[attr-defined]
+        # Items added by hand carry no AniList id; take it from the catalog by normalized title
+        catalog_match = (
+            select(func.min(CatalogEntry.anilist_id))
+            .where(CatalogEntry.type == LibraryItem.type, CatalogEntry.title_key == LibraryItem.title_key)
+            .scalar_subquery()
+        )
+        session.exec(  # type: ignore[call-overload]
+            update(LibraryItem)
+            .where(LibraryItem.anilist_id.is_(None), in_progress)  # type: ignore[union-attr]
+            .where(exists().where(CatalogEntry.type == LibraryItem.type, CatalogEntry.title_key == LibraryItem.title_key))
+            .values(anilist_id=catalog_match)
+        )
+        watched = exists().where(ReleaseWatch.anilist_id == LibraryItem.anilist_id)
+        session.exec(  # type: ignore[call-overload]
+            insert(ReleaseWatch).from_select(
+                ["anilist_id", "next_check_at"],
+                select(LibraryItem.anilist_id, literal(now, ReleaseWatch.__table__.c.next_check_at.type))  # type: ignore[attr-defined]
+                .where(LibraryItem.anilist_id.is_not(None), in_progress, ~watched)  # type: ignore[union-attr]
+                .distinct(),
+            )
+        )
+        # Items that started, or went back in progress, after the media was last checked
+        # still get its latest release: _apply only fans out to items in progress at the time
+        known_latest = (
+            select(ReleaseWatch.latest).where(ReleaseWatch.anilist_id == LibraryItem.anilist_id).scalar_subquery()
+        )
+        behind = exists().where(
+            ReleaseWatch.anilist_id == LibraryItem.anilist_id,
+            ReleaseWatch.latest.is_not(None),  # type: ignore[union-attr]
+            or_(LibraryItem.latest_release.is_(None), LibraryItem.latest_release < ReleaseWatch.latest),  # type: ignore[union-attr]
+        )
+        session.exec(  # type: ignore[call-overload]
+            update(LibraryItem)
+            .where(LibraryItem.anilist_id.is_not(None), in_progress, behind)  # type: ignore[union-attr]
+            .values(latest_release=known_latest, new_release=LibraryItem.progress < known_latest)
+        )
+        referenced = exists().where(LibraryItem.anilist_id == ReleaseWatch.anilist_id, in_progress)
+        session.exec(delete(ReleaseWatch).where(~referenced))  # type: ignore[call-overload]
+        session.commit()
+
+    def _due(self, now: datetime) -> List[int]:
+        with Session(get_engine()) as session:
+            self.sync_watchlist(session, now)
+            return list(session.exec(
+                select(ReleaseWatch.anilist_id)
+                .where(ReleaseWatch.next_check_at <= now)
+                .order_by(ReleaseWatch.next_check_at)  # type: ignore[arg-type]
+                .limit(self.max_per_cycle)
+            ).all())
+
+    def _apply(self, ids: List[int], media: List[Dict[str, Any]], now: datetime) -> int:
+        """Store the checked state and fan out releases; returns the number of items updated."""
+        by_id = {int(m["id"]): m for m in media if m.get("id")}
+        updated = 0
+        with Session(get_engine()) as session:
+            watches = session.exec(select(ReleaseWatch).where(ReleaseWatch.anilist_id.in_(ids))).all()  # type: ignore[attr-defined]
+            for w in watches:
+                w.checked_at = now
+                m = by_id.get(w.anilist_id)
+                if m is None:
+                    w.next_check_at = now + MISSING_RECHECK
+                    continue
+                upcoming = m.get("nextAiringEpisode") or {}
+                w.status = m.get("status")
+                w.next_airing_at = (
+                    datetime.fromtimestamp(upcoming["airingAt"], timezone.utc) if upcoming.get("airingAt") else None
+                )
+                w.next_check_at = next_check(w.status, w.next_airing_at, now)
+                latest = latest_release(m)
+                if latest is not None and (w.latest is None or latest > w.latest):
+                    w.latest = latest
+                    result = session.exec(  # type: ignore[call-overload]
+                        update(LibraryItem)
+                        .where(LibraryItem.anilist_id == w.anilist_id, LibraryItem.status.in_(IN_PROGRESS))  # type: ignore[attr-defined]
+                        .values(latest_release=latest, new_release=LibraryItem.progress < latest)
+                    )
+                    updated += result.rowcount
+            session.add_all(watches)
+            session.commit()
+        return updated
+
+    async def poll_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Check every due media once. Batches that fail upstream stay due for the next cycle.
+
+        Does nothing while another poller holds the lease.
+        """
+        now = now or datetime.now(timezone.utc)
+        # DB work runs in a thread so a large fan-out doesn't stall the event loop
+        if not await asyncio.to_thread(self._hold_lease):
+            return {"due": 0, "checked": 0, "failed": 0, "updated_items": 0}
+        due = await asyncio.to_thread(self._due, now)
+        checked = failed = updated = 0
+        for start in range(0, len(due), self.batch_size):
+            batch = due[start:start + self.batch_size]
+            if start:
+                if self.pause > 0:
+                    await asyncio.sleep(self.pause)
+                # A long cycle keeps renewing; if the lease was lost anyway, leave the rest due
+                if not await asyncio.to_thread(self._hold_lease):
+                    logger.warning("release poller lost its lease; %d media left for the new holder", len(due) - start)
+                    break
+            try:
+                media = await self._fetch(batch)
+            except Exception as e:
+                logger.warning("release check failed for %d media: %s", len(batch), e)
+                failed += len(batch)
+                continue
+            updated += await asyncio.to_thread(self._apply, batch, media, now)
+            checked += len(batch)
+        return {"due": len(due), "checked": checked, "failed": failed, "updated_items": updated}
+
+    async def run(self, interval: float) -> None:
+        """Poll forever; meant to be started as a task from the app lifespan."""
+        try:
+            while True:
+                try:
+                    await self.poll_once()
+                except Exception:
+                    logger.exception("release poll crashed; retrying next interval")
+                await asyncio.sleep(interval)
+        finally:
+            await asyncio.to_thread(leases.release, self.lease, self.holder)
+
+
+release_poller = ReleasePoller(
+    batch_size=settings.release_batch_size,
+    max_per_cycle=settings.release_max_per_cycle,
+    pause=settings.release_batch_pause,
+    # The lease outlives one missed cycle, so a slow poll doesn't hand it over
+    lease_ttl=2 * settings.release_poll_seconds + 60,
+)
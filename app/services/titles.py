@@ -0,0 +1,197 @@
+from __future__ import annotations
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.engine import Dialect
+from sqlmodel import Session, select, func, delete
+
+from ..models import LibraryItem, TitleTrigram
+
+# "Season 2", "2nd Season", "S2" -> "s2"; "Part 2", "Cour 2" -> "p2". Season/part 1 is dropped so
+# "Title" and "Title Season 1" share a key.
+_SEASON_PATTERNS: Tuple[Tuple[re.Pattern[str], str], ...] = (
+    (re.compile(r"\b(\d+)(?:st|nd|rd|th)\s+season\b"), r" s\1 "),
+    (re.compile(r"\bseason\s+(\d+)\b"), r" s\1 "),
+    (re.compile(r"\bs(\d+)\b"), r" s\1 "),
+    (re.compile(r"\b(?:part|cour)\s+(\d+)\b"), r" p\1 "),
+    (re.compile(r"\b(\d+)(?:st|nd|rd|th)\s+(?:part|cour)\b"), r" p\1 "),
+)
+_FIRST = re.compile(r"\b[sp]0*1\b")
+_NON_WORD = re.compile(r"[^\w]+")
+_LEADING_ARTICLE = re.compile(r"^(?:the|a|an)\s+")
+
+# Grams shared by more titles than this (per user) are too common to narrow candidates
+MAX_GRAM_FREQUENCY = 50
+# title_key of rows written before the column existed, and what the backfill stores for
+# titles that normalize to nothing; neither identifies a title, so neither ever matches
+MISSING_KEYS = frozenset({"", "-"})
+
+
+def normalize_title(title: str) -> str:
+    """Canonical key for a title: case, accents, punctuation and season suffix spelling folded."""
+    text = unicodedata.normalize("NFKD", title or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = text.replace("&", " and ")
+    text = _NON_WORD.sub(" ", text).replace("_", " ")
+    for pattern, repl in _SEASON_PATTERNS:
+        text = pattern.sub(repl, text)
+    text = _FIRST.sub(" ", text)
+    text = " ".join(text.split())
+    return _LEADING_ARTICLE.sub("", text) or text
+
+
+def trigrams(key: str) -> Set[str]:
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams: Set[str] = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the trigram sets of two keys (1.0 = identical)."""
+    ga, gb = trigrams(a), trigrams(b)
+    if not ga or not gb:
+        return 1.0 if a == b else 0.0
+    return len(ga & gb) / len(ga | gb)
+
+
+def index_items(session: Session, items: Iterable[LibraryItem]) -> None:
+    """Set title_key and write trigram rows for new items. Items must already have ids (flush first)."""
+    keys: List[Tuple[int, int, str]] = []
+    for item in items:
+        assert item.id is not None
+        if not item.title_key:
+            item.title_key = normalize_title(item.title)
+        keys.append((item.id, item.user_id, item.title_key))
+    index_keys(session, keys)
+
+
+def _trigram_insert(dialect: Dialect) -> Tuple[str, bool]:
+    """INSERT for TitleTrigram compiled for ``dialect``, and whether it takes positional params."""
+    if dialect.name not in _TRIGRAM_INSERT:
+        compiled = insert(TitleTrigram).inline().compile(dialect=dialect, column_keys=list(_GRAM_COLUMNS))
+        _TRIGRAM_INSERT[dialect.name] = (str(compiled), bool(compiled.positional))
+    return _TRIGRAM_INSERT[dialect.name]
+
+
+_GRAM_COLUMNS = ("item_id", "user_id", "gram")
+_TRIGRAM_INSERT: Dict[str, Tuple[str, bool]] = {}
+
+
+def index_keys(session: Session, keys: Iterable[Tuple[int, int, str]]) -> None:
+    """Write trigram rows for ``(item_id, user_id, title_key)`` triples.
+
+    Grams (~20 per title) go straight to the driver's executemany: per-row parameter
+    processing in SQLAlchemy cost more than the inserts themselves on bulk imports.
+    """
+    rows = [(item_id, user_id, g) for item_id, user_id, key in keys for g in trigrams(key)]
+    if not rows:
+        return
+    conn = session.connection()
+    sql, positional = _trigram_insert(conn.dialect)
+    conn.exec_driver_sql(sql, rows if positional else [dict(zip(_GRAM_COLUMNS, r)) for r in rows])
+
+
+def ensure_keys(session: Session, user_id: int) -> None:
+    """Key and index the user's rows that predate title_key, if ``app.migrate`` hasn't yet.
+
+    Each row is claimed with a conditional UPDATE, so concurrent requests don't index it twice.
+    """
+    rows = session.exec(
+        select(LibraryItem.id, LibraryItem.title).where(LibraryItem.user_id == user_id, LibraryItem.title_key == "")
+    ).all()
+    if not rows:
+        return
+    keys: List[Tuple[int, int, str]] = []
+    for item_id, title in rows:
+        key = normalize_title(title) or "-"
+        claimed = session.exec(  # type: ignore[call-overload]
+            update(LibraryItem).where(LibraryItem.id == item_id, LibraryItem.title_key == "").values(title_key=key)
+        ).rowcount
+        if claimed and key not in MISSING_KEYS:
+            keys.append((item_id, user_id, key))
+    index_keys(session, keys)
+    session.commit()
+
+
+def unindex_item(session: Session, item_id: int) -> None:
+    session.exec(delete(TitleTrigram).where(TitleTrigram.item_id == item_id))  # type: ignore[call-overload]
+
+
+def find_duplicate_groups(session: Session, user_id: int, threshold: float = 0.6) -> List[Dict[str, object]]:
+    """Group a user's items that are exact (same key) or fuzzy (trigram similarity) duplicates.
+
+    Candidate pairs come from the trigram index: items sharing at least one reasonably rare
+    gram. Only those pairs are scored, so cost tracks the number of near matches rather
+    than the square of the library size.
+    """
+    items = session.exec(
+        select(LibraryItem.id, LibraryItem.type, LibraryItem.title_key).where(LibraryItem.user_id == user_id)
+    ).all()
+    info: Dict[int, Tuple[str, str]] = {i: (t, k) for i, t, k in items}
+
+    pairs: Set[Tuple[int, int]] = set()
+    by_key: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for item_id, (mtype, key) in info.items():
+        if key not in MISSING_KEYS:
+            by_key[(mtype, key)].append(item_id)
+    for ids in by_key.values():
+        pairs.update((ids[0], other) for other in ids[1:])
+
+    if threshold < 1.0:
+        rare = (
+            select(TitleTrigram.gram)
+            .where(TitleTrigram.user_id == user_id)
+            .group_by(TitleTrigram.gram)
+            .having(func.count() <= MAX_GRAM_FREQUENCY)
+        ).subquery()
+        a = TitleTrigram.__table__.alias("a")  # type: ignore[attr-defined]
+        b = TitleTrigram.__table__.alias("b")  # type: ignore[attr-defined]
+        candidates = session.exec(
+            select(a.c.item_id, b.c.item_id)
+            .join(b, (a.c.user_id == b.c.user_id) & (a.c.gram == b.c.gram) & (a.c.item_id < b.c.item_id))
+            .where(a.c.user_id == user_id, a.c.gram.in_(select(rare.c.gram)))
+            .distinct()
+        ).all()
+        for x, y in candidates:
+            if x in info and y in info and info[x][0] == info[y][0] and similarity(info[x][1], info[y][1]) >= threshold:
+                pairs.add((x, y))
+
+    # Union-find over matched pairs
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for x, y in pairs:
+        parent[find(x)] = find(y)
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for x in parent:
+        groups[find(x)].append(x)
+    return [
+        {"type": info[ids[0]][0], "title_key": info[min(ids)][1], "item_ids": sorted(ids)}
+        for ids in groups.values()
+        if len(ids) > 1
+    ]
+
+
+def best_match(query_key: str, candidates: Sequence[Tuple[Optional[str], ...]]) -> int:
+    """Index of the candidate (tuple of alternative titles) closest to query_key; 0 if none match."""
+    best, best_score = 0, 0.0
+    for idx, titles in enumerate(candidates):
+        for t in titles:
+            if not t:
+                continue
+            score = similarity(query_key, normalize_title(t))
+            if score > best_score:
+                best, best_score = idx, score
+    return best
@@ -0,0 +1,298 @@
+"""Streaming export/import of a user's library as NDJSON or CSV.
+
+Both directions hold at most one batch in memory: export walks a server-side cursor
+(``yield_per``) and emits one chunk per partition; import parses the request body as it
+arrives and commits every ``IMPORT_BATCH`` rows, so a 100k-row file never sits in memory.
+"""
+from __future__ import annotations
+import asyncio
+import csv
+import io
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+import orjson
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from ..db import get_engine
+from ..models import LibraryItem
+from . import progress
+from .titles import MISSING_KEYS, ensure_keys, index_keys, normalize_title
+
+EXPORT_FIELDS = ("title", "type", "source", "cover_url", "status", "progress", "created_at", "updated_at")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_BATCH = 1000
+IMPORT_BATCH = 1000
+MAX_REPORTED_ERRORS = 20
+MAX_CSV_RECORD_CHARS = 64 * 1024  # a quoted field spanning more than this is taken as unterminated
+
+
+class ImportRow(BaseModel):
+    """One library entry in an export file; unknown fields (e.g. ``id``) are ignored."""
+    title: str = Field(min_length=1)
+    type: str
+    source: str = "import"
+    cover_url: Optional[str] = None
+    status: str = "planning"
+    progress: int = Field(0, ge=0)
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+def format_for(content_type: Optional[str]) -> Optional[str]:
+    """Map a request Content-Type to an import format, if it names one."""
+    if not content_type:
+        return None
+    mime = content_type.split(";")[0].strip().lower()
+    for fmt, media_type in MEDIA_TYPES.items():
+        if mime == media_type or (fmt == "ndjson" and mime in ("application/jsonl", "application/json-seq")):
+            return fmt
+    return None
+
+
+# --- export -------------------------------------------------------------------------------
+
+def _csv_chunk(rows: List[Tuple[Any, ...]], header: bool) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(
+        tuple(v.isoformat() if isinstance(v, datetime) else v for v in row) for row in rows
+    )
+    return buf.getvalue().encode()
+
+
+def export_chunks(user_id: int, fmt: str) -> Iterator[bytes]:
+    """Yield the user's library encoded as ``fmt``, one chunk per cursor partition.
+
+    Runs in Starlette's threadpool (sync generator) with its own session: the request's
+    session dependency is closed before a streaming body is sent.
+    """
+    columns = [getattr(LibraryItem, f) for f in EXPORT_FIELDS]
+    with Session(get_engine()) as session:
+        result = session.execute(
+            select(*columns)
+            .where(LibraryItem.user_id == user_id)
+            .order_by(LibraryItem.id)  # type: ignore[arg-type]
+            .execution_options(yield_per=EXPORT_BATCH)
+        )
+        if fmt == "csv":
+            yield _csv_chunk([], header=True)
+        for partition in result.partitions():
+            if fmt == "csv":
+                yield _csv_chunk([tuple(r) for r in partition], header=False)
+            else:
+                yield b"".join(orjson.dumps(dict(zip(EXPORT_FIELDS, r))) + b"\n" for r in partition)
+
+
+# --- import -------------------------------------------------------------------------------
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """Re-split arbitrary body chunks into complete lines; yields one list per chunk."""
+    tail = b""
+    first = True
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if first:
+            chunk = chunk.removeprefix(b"\xef\xbb\xbf")  # UTF-8 BOM from spreadsheet exports
+            first = False
+        parts = (tail + chunk).split(b"\n")
+        tail = parts.pop()
+        if parts:
+            yield [p.decode("utf-8", errors="replace").rstrip("\r") for p in parts]
+    if tail.strip():
+        yield [tail.decode("utf-8", errors="replace").rstrip("\r")]
+
+
+def _still_quoted(line: str, quoted: bool) -> bool:
+    """Whether a CSV record is still inside a quoted field after ``line``.
+
+    Follows ``csv.reader``'s default dialect: a quote only opens a quoted field as the
+    first character of a field, so ``12" Figure`` is a plain field; ``""`` inside quotes
+    is an escaped quote.
+    """
+    if not quoted and '"' not in line:
+        return False
+    field_start = not quoted
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if quoted:
+            if c == '"':
+                if i + 1 < n and line[i + 1] == '"':
+                    i += 1
+                else:
+                    quoted = False
+        elif c == ",":
+            field_start = True
+            i += 1
+            continue
+        elif c == '"' and field_start:
+            quoted = True
+        field_start = False
+        i += 1
+    return quoted
+
+
+async def parse_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[List[Tuple[int, Any]]]:
+    """Yield batches of ``(line_number, record)``; a record is a dict or a parse error string."""
+    lineno = 0
+    header: Optional[List[str]] = None
+    pending: List[str] = []  # CSV lines of a record whose quoted field spans a newline
+    pending_chars = 0
+    quoted = False
+    async for lines in _lines(chunks):
+        out: List[Tuple[int, Any]] = []
+        if fmt == "ndjson":
+            for line in lines:
+                lineno += 1
+                if not line.strip():
+                    continue
+                try:
+                    out.append((lineno, orjson.loads(line)))
+                except orjson.JSONDecodeError as e:
+                    out.append((lineno, f"invalid JSON: {e}"))
+        else:
+            records: List[Tuple[int, str]] = []
+            for line in lines:
+                lineno += 1
+                quoted = _still_quoted(line, quoted)
+                if quoted:
+                    pending.append(line)
+                    pending_chars += len(line) + 1
+                    if pending_chars > MAX_CSV_RECORD_CHARS:
+                        break
+                    continue
+                start = lineno - len(pending)
+                records.append((start, "\n".join(pending + [line]) if pending else line))
+                pending, pending_chars = [], 0
+            for (start, _), values in zip(records, csv.reader(r for _, r in records)):
+                if not values:
+                    continue
+                if header is None:
+                    header = [h.strip() for h in values]
+                    continue
+                # Empty CSV cells mean "use the default", not an empty string
+                out.append((start, {k: v for k, v in zip(header, values) if v != ""}))
+            if pending_chars > MAX_CSV_RECORD_CHARS:
+                # Don't buffer the rest of the upload behind one runaway quote
+                out.append((lineno - len(pending) + 1, "unterminated quoted field"))
+                yield out
+                return
+        if out:
+            yield out
+    if pending:
+        yield [(lineno - len(pending) + 1, "unterminated quoted field")]
+
+
+class LibraryImporter:
+    """Writes validated rows for one user in batched transactions, skipping duplicates.
+
+    Duplicates are rows whose (type, normalized title) is already in the library or
+    earlier in the file; only those keys are held in memory. Batches are written with a
+    Core ``INSERT ... RETURNING id`` executemany rather than ORM objects, which dominated
+    the cost of large imports.
+
+    ``load_existing`` and ``flush`` do blocking DB work in a session of their own, so
+    :func:`import_stream` runs them in a worker thread instead of on the event loop.
+    """
+
+    def __init__(self, user_id: int, skip_duplicates: bool = True) -> None:
+        self.user_id = user_id
+        self.skip_duplicates = skip_duplicates
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self._batch: List[Dict[str, Any]] = []
+        self._seen: Set[Tuple[str, str]] = set()
+
+    def load_existing(self) -> None:
+        if not self.skip_duplicates:
+            return
+        with Session(get_engine()) as session:
+            ensure_keys(session, self.user_id)
+            self._seen.update(
+                (t, key)
+                for t, key in session.exec(
+                    select(LibraryItem.type, LibraryItem.title_key).where(LibraryItem.user_id == self.user_id)
+                ).all()
+                if key not in MISSING_KEYS
+            )
+
+    @property
+    def batch_full(self) -> bool:
+        return len(self._batch) >= IMPORT_BATCH
+
+    def _error(self, lineno: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {lineno}: {message}")
+
+    def add(self, lineno: int, record: Any) -> None:
+        if isinstance(record, str):
+            self._error(lineno, record)
+            return
+        if not isinstance(record, dict):
+            self._error(lineno, "expected an object")
+            return
+        try:
+            row = ImportRow.model_validate(record)
+        except ValidationError as e:
+            first = e.errors()[0]
+            self._error(lineno, f"{'.'.join(str(p) for p in first['loc'])}: {first['msg']}")
+            return
+        key = normalize_title(row.title)
+        if self.skip_duplicates:
+            if (row.type, key) in self._seen:
+                self.skipped += 1
+                return
+            self._seen.add((row.type, key))
+        data = row.model_dump()
+        # executemany needs the same keys in every row, so fill the timestamp defaults here
+        now = datetime.now(timezone.utc)
+        data["created_at"] = data["created_at"] or now
+        data["updated_at"] = data["updated_at"] or data["created_at"]
+        data.update(user_id=self.user_id, title_key=key)
+        self._batch.append(data)
+
+    def flush(self) -> None:
+        """Write the buffered rows in one transaction."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        with Session(get_engine()) as session:
+            ids = session.connection().execute(
+                insert(LibraryItem).returning(LibraryItem.id, sort_by_parameter_order=True), batch  # type: ignore[arg-type]
+            ).scalars().all()
+            index_keys(session, ((i, self.user_id, r["title_key"]) for i, r in zip(ids, batch)))
+            progress.record(session, [
+                progress.event(self.user_id, i, r["type"], "import", r["progress"], r["status"])
+                for i, r in zip(ids, batch)
+            ])
+            session.commit()
+        self.imported += len(batch)
+
+    def summary(self) -> Dict[str, Any]:
+        return {"imported": self.imported, "skipped": self.skipped, "failed": self.failed, "errors": self.errors}
+
+
+async def import_stream(user_id: int, chunks: AsyncIterator[bytes], fmt: str, skip_duplicates: bool = True) -> Dict[str, Any]:
+    """Parse on the event loop, write batches from a worker thread.
+
+    A large import would otherwise hold the loop for every INSERT and commit, stalling
+    all other requests on the worker.
+    """
+    importer = LibraryImporter(user_id, skip_duplicates)
+    await asyncio.to_thread(importer.load_existing)
+    async for batch in parse_records(chunks, fmt):
+        for lineno, record in batch:
+            importer.add(lineno, record)
+            if importer.batch_full:
+                await asyncio.to_thread(importer.flush)
+    await asyncio.to_thread(importer.flush)
+    return importer.summary()
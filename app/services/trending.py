@@ -0,0 +1,167 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Mapping, Optional, Tuple
+
+from ..config import settings
+from . import leases
+from .anilist import Suggestion, fetch_trending
+
+logger = logging.getLogger(__name__)
+
+MediaType = Literal["anime", "manga"]
+MEDIA_TYPES: Tuple[MediaType, ...] = ("anime", "manga")
+Fetcher = Callable[[MediaType, int], Awaitable[List[Suggestion]]]
+
+
+@dataclass(frozen=True)
+class Feed:
+    items: List[Suggestion]
+    fetched_at: Optional[datetime]
+    body: bytes  # pre-rendered JSON response, so serving is a dict lookup
+
+
+def _render(media_type: MediaType, items: List[Suggestion], fetched_at: Optional[datetime]) -> Feed:
+    payload = {
+        "type": media_type,
+        "fetched_at": fetched_at.isoformat() if fetched_at else None,
+        "items": items,
+    }
+    return Feed(items=items, fetched_at=fetched_at, body=json.dumps(payload, separators=(",", ":")).encode())
+
+
+class TrendingSnapshot:
+    """Trending feeds served from memory and refreshed in the background.
+
+    Refreshes build a complete new mapping and publish it with one reference assignment
+    (double buffering), so readers never wait on or observe a half-built snapshot. If
+    upstream fails for a media type, the last good feed is kept. Each successful refresh
+    is written to disk so a restarted worker serves the previous snapshot immediately.
+
+    With several workers only the holder of the ``lease`` refreshes; the others reload
+    the snapshot it writes.
+    """
+
+    def __init__(self, path: str, per_page: int = 20, fetch: Fetcher = fetch_trending, lease: str = "trending-refresh") -> None:
+        self.path = path
+        self.per_page = per_page
+        self._fetch = fetch
+        self.lease = lease
+        self.holder = leases.new_holder()
+        self._feeds: Mapping[MediaType, Feed] = {t: _render(t, [], None) for t in MEDIA_TYPES}
+        self._loaded = False
+        self._mtime: Optional[int] = None
+
+    def get(self, media_type: MediaType) -> Feed:
+        if not self._loaded:
+            self.load()
+        return self._feeds[media_type]
+
+    def load(self) -> None:
+        """Warm start from the last persisted snapshot, if any."""
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._mtime = os.fstat(f.fileno()).st_mtime_ns
+                raw: Dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("ignoring unreadable trending snapshot %s: %s", self.path, e)
+            return
+        feeds = dict(self._feeds)
+        for t in MEDIA_TYPES:
+            entry = raw.get(t)
+            if not entry or not entry.get("items"):
+                continue
+            fetched_at = datetime.fromisoformat(entry["fetched_at"]) if entry.get("fetched_at") else None
+            feeds[t] = _render(t, list(entry["items"]), fetched_at)
+        self._feeds = feeds
+
+    def reload_if_changed(self) -> None:
+        """Pick up a snapshot another worker wrote since we last read it."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.load()
+
+    def _save(self, feeds: Mapping[MediaType, Feed]) -> None:
+        data = {
+            t: {"fetched_at": f.fetched_at.isoformat() if f.fetched_at else None, "items": f.items}
+            for t, f in feeds.items()
+        }
+        # A temp file of our own, so concurrent writers never interleave into one file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.replace(tmp, self.path)  # atomic: a crash never leaves a truncated snapshot
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    async def refresh(self) -> bool:
+        """Fetch all feeds and publish them. Returns True if every media type refreshed."""
+        if not self._loaded:
+            self.load()
+        feeds = dict(self._feeds)
+        ok = True
+        changed = False
+        for t in MEDIA_TYPES:
+            try:
+                items = await self._fetch(t, self.per_page)
+            except Exception as e:
+                logger.warning("trending refresh failed for %s, keeping last good copy: %s", t, e)
+                ok = False
+                continue
+            if not items:
+                ok = False
+                continue
+            feeds[t] = _render(t, items, datetime.now(timezone.utc))
+            changed = True
+        if not changed:
+            return False
+        self._feeds = feeds  # the swap
+        try:
+            await asyncio.to_thread(self._save, feeds)
+        except OSError as e:
+            logger.warning("could not persist trending snapshot to %s: %s", self.path, e)
+        return ok
+
+    async def tick(self, interval: float) -> bool:
+        """One cycle: refresh if we hold the lease, else follow the holder's snapshot.
+
+        Returns True if this instance refreshed.
+        """
+        # The lease outlives one missed cycle, so a slow refresh doesn't hand it over
+        if await asyncio.to_thread(leases.acquire, self.lease, self.holder, 2 * interval + 60):
+            await self.refresh()
+            return True
+        self.reload_if_changed()
+        return False
+
+    async def run(self, interval: float) -> None:
+        """Refresh forever; meant to be started as a task from the app lifespan."""
+        try:
+            while True:
+                try:
+                    await self.tick(interval)
+                except Exception:
+                    logger.exception("trending refresh crashed; retrying next interval")
+                await asyncio.sleep(interval)
+        finally:
+            await asyncio.to_thread(leases.release, self.lease, self.holder)
+
+
+trending_snapshot = TrendingSnapshot(settings.trending_snapshot_path, per_page=settings.trending_per_page)
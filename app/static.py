@@ -0,0 +1,58 @@
+from __future__ import annotations
+import os
+import re
+from mimetypes import guess_type
+from typing import Dict, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Names produced by scripts/build_frontend.py, e.g. app.3f2a9c1d0b.js
+HASHED_NAME = re.compile(r"\.[0-9a-f]{10}\.[A-Za-z0-9]+$")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Preferred first; files are only served if the precompressed sibling exists on disk
+PRECOMPRESSED: Tuple[Tuple[str, str], ...] = (("br", ".br"), ("gzip", ".gz"))
+
+
+def cache_control_for(name: str) -> str:
+    """Content-hashed assets never change; everything else (index.html) revalidates via ETag."""
+    return IMMUTABLE_CACHE if HASHED_NAME.search(name) else REVALIDATE_CACHE
+
+
+def _accepted_encodings(scope: Scope) -> set[str]:
+    header = Headers(scope=scope).get("accept-encoding", "")
+    return {part.split(";")[0].strip().lower() for part in header.split(",") if part.strip()}
+
+
+class FrontendFiles(StaticFiles):
+    """StaticFiles that serves precompressed siblings (.br/.gz) and sets cache headers."""
+
+    def file_response(
+        self,
+        full_path: str | os.PathLike[str],
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        path = os.fspath(full_path)
+        name = os.path.basename(path)
+        headers: Dict[str, str] = {"Cache-Control": cache_control_for(name), "Vary": "Accept-Encoding"}
+        media_type = guess_type(name)[0] or "text/plain"
+
+        accepted = _accepted_encodings(scope)
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                path = path + suffix
+                stat_result = os.stat(path)
+                headers["Content-Encoding"] = encoding
+                break
+
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
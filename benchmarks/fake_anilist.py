@@ -0,0 +1,103 @@
+"""Local stand-in for the AniList GraphQL API used by the benchmark suite.
+
+Answers the three query shapes the app sends (search, trending, MediaListCollection)
+with synthetic data. Latency and error rate are configurable so upstream behaviour
+can be varied without touching the network.
+"""
+from __future__ import annotations
+import asyncio
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 0.0
+    error_rate: float = 0.0
+    collection_size: int = 100
+    seed: int = 1234
+    rng: random.Random = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.seed)
+
+
+config = FakeConfig()
+app = FastAPI()
+
+
+def _media(i: int, media_type: str) -> Dict[str, Any]:
+    return {
+        "id": i,
+        "type": media_type,
+        "title": {"romaji": f"Bench Title {i}", "english": f"Bench Title {i}", "native": None},
+        "coverImage": {"large": f"https://img.example/{i}.jpg", "medium": f"https://img.example/{i}_m.jpg"},
+        "siteUrl": f"https://anilist.co/{media_type.lower()}/{i}",
+        "chapters": None if media_type == "ANIME" else 100 + i % 50,
+        "episodes": 12 + i % 13 if media_type == "ANIME" else None,
+    }
+
+
+def _collection(size: int, media_type: str) -> Dict[str, Any]:
+    statuses = ["CURRENT", "COMPLETED", "PLANNING", "DROPPED"]
+    entries: List[Dict[str, Any]] = []
+    for i in range(size):
+        entries.append({"status": statuses[i % 4], "progress": i % 24, "score": 0, "media": _media(i, media_type)})
+    return {"Viewer": {"id": 1, "name": "bench"}, "MediaListCollection": {"lists": [{"name": "All", "entries": entries}]}}
+
+
+@app.post("/")
+async def graphql(request: Request):
+    body = await request.json()
+    query: str = body.get("query", "")
+    variables: Dict[str, Any] = body.get("variables") or {}
+    if config.latency_ms:
+        await asyncio.sleep(config.latency_ms / 1000.0)
+    if config.error_rate and config.rng.random() < config.error_rate:
+        return JSONResponse({"errors": [{"message": "fake upstream failure"}]}, status_code=500)
+    media_type = variables.get("type") or "ANIME"
+    if "MediaListCollection" in query:
+        return {"data": _collection(config.collection_size, media_type)}
+    per_page = int(variables.get("perPage") or 8)
+    return {"data": {"Page": {"media": [_media(i, media_type) for i in range(per_page)]}}}
+
+
+class FakeAniListServer:
+    """Runs the fake API with uvicorn in a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: Optional[int] = None) -> None:
+        self.host = host
+        self.port = port or _free_port()
+        self._server = uvicorn.Server(uvicorn.Config(app, host=self.host, port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self) -> "FakeAniListServer":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("fake AniList server did not start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
@@ -0,0 +1,82 @@
+"""Cold-start benchmark: process launch -> first successful request.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--auto-create-schema]
+
+Each run starts a fresh ``uvicorn app.main:app`` process against a throwaway SQLite
+database that was migrated beforehand (``python -m app.migrate``), then polls
+``/health`` until it answers. It also reports the bare ``import app.main`` time measured
+in a separate interpreter. Pass ``--auto-create-schema`` to compare against workers that
+run ``create_all`` themselves.
+"""
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from .fake_anilist import _free_port
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_time(env: Dict[str, str]) -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def boot_to_first_request(env: Dict[str, str], timeout: float = 30.0) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited: {proc.stderr.read().decode() if proc.stderr else ''}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("server did not become ready in time")
+            time.sleep(0.005)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--auto-create-schema", action="store_true", help="let each worker run create_all")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="anime-tracker-startup-")
+    env = {k: v for k, v in os.environ.items() if k not in ("TESTING", "PYTEST", "PYTEST_CURRENT_TEST")}
+    env["DATABASE_URL"] = f"sqlite:///{workdir}/startup.db"
+    env["AUTO_CREATE_SCHEMA"] = "1" if args.auto_create_schema else "0"
+    env["TRENDING_REFRESH_SECONDS"] = "0"  # no upstream calls during the measurement
+    env["RELEASE_POLL_SECONDS"] = "0"
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=ROOT, env=env, check=True, capture_output=True)
+
+    imports = [import_time(env) for _ in range(args.runs)]
+    boots = [boot_to_first_request(env) for _ in range(args.runs)]
+    print(f"import app.main       median {statistics.median(imports) * 1000:8.1f} ms   max {max(imports) * 1000:8.1f} ms")
+    print(f"boot -> first request median {statistics.median(boots) * 1000:8.1f} ms   max {max(boots) * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+const apiBase = "/api";
+let token = localStorage.getItem("token") || "";
+
+function authHeader() { return token ? { 'Authorization': `Bearer ${token}` } : {}; }
+
+// Library list is virtualized: only cards in (or near) the viewport exist in the DOM.
+// Pages of PAGE_SIZE items are fetched as the user scrolls, and a small pool of card
+// elements is re-bound to whichever items are visible instead of rebuilding the list.
+const PAGE_SIZE = 100;
+const ROW_HEIGHT = 84; // px; .vcard height (app.css) + gap
+const OVERSCAN = 6;    // extra rows rendered above/below the viewport
+const lib = { total: 0, pages: new Map(), pending: new Map(), pool: [], generation: 0 };
+const maxCache = new Map();
+let renderQueued = false;
+
+function resetList(html) {
+  const list = document.getElementById('items');
+  list.classList.remove('vlist');
+  list.style.height = '';
+  list.innerHTML = html;
+  lib.pool = [];
+  lib.total = 0;
+}
+
+async function loadItems() {
+  lib.generation++;
+  lib.pages.clear();
+  lib.pending.clear();
+  if (!token) { resetList('<div class="muted">Sign in to see your library.</div>'); return; }
+  const ok = await fetchPage(0, lib.generation);
+  if (!ok) { resetList('<div class="muted">Failed to load.</div>'); return; }
+  const list = document.getElementById('items');
+  if (!list.classList.contains('vlist')) {
+    resetList('');
+    list.classList.add('vlist');
+  }
+  renderWindow();
+}
+
+function fetchPage(page, gen) {
+  if (lib.pages.has(page)) return Promise.resolve(true);
+  if (lib.pending.has(page)) return lib.pending.get(page);
+  const p = (async () => {
+    try {
+      const resp = await fetch(`${apiBase}/library/items?limit=${PAGE_SIZE}&offset=${page * PAGE_SIZE}`, { headers: { ...authHeader() } });
+      if (!resp.ok) return false;
+      const items = await resp.json();
+      if (gen !== lib.generation) return false; // list was reloaded meanwhile
+      lib.total = Number(resp.headers.get('X-Total-Count') ?? items.length);
+      lib.pages.set(page, items);
+      return true;
+    } catch { return false; }
+    finally { if (gen === lib.generation) lib.pending.delete(page); }
+  })();
+  lib.pending.set(page, p);
+  return p;
+}
+
+function itemAt(index) {
+  const page = lib.pages.get(Math.floor(index / PAGE_SIZE));
+  return page ? page[index % PAGE_SIZE] : null;
+}
+
+function scheduleRender() {
+  if (renderQueued) return;
+  renderQueued = true;
+  requestAnimationFrame(() => { renderQueued = false; renderWindow(); });
+}
+
+function renderWindow() {
+  const list = document.getElementById('items');
+  if (!list.classList.contains('vlist')) return;
+  list.style.height = `${lib.total * ROW_HEIGHT}px`;
+  const offsetTop = list.getBoundingClientRect().top + window.scrollY;
+  const viewTop = window.scrollY - offsetTop;
+  const first = Math.max(0, Math.floor(viewTop / ROW_HEIGHT) - OVERSCAN);
+  const last = Math.min(lib.total, Math.ceil((viewTop + window.innerHeight) / ROW_HEIGHT) + OVERSCAN);
+
+  while (lib.pool.length < last - first) {
+    const el = createCard();
+    list.appendChild(el);
+    lib.pool.push(el);
+  }
+  lib.pool.forEach((el, k) => {
+    const index = first + k;
+    if (index >= last) { hideCard(el); return; }
+    el.style.display = '';
+    el.style.transform = `translateY(${index * ROW_HEIGHT}px)`;
+    bindCard(el, itemAt(index));
+  });
+
+  // Fetch pages covering the visible window that we don't have yet
+  const gen = lib.generation;
+  for (let page = Math.floor(first / PAGE_SIZE); first < last && page <= Math.floor((last - 1) / PAGE_SIZE); page++) {
+    if (!lib.pages.has(page) && !lib.pending.has(page)) {
+      fetchPage(page, gen).then(ok => { if (ok && gen === lib.generation) scheduleRender(); });
+    }
+  }
+}
+
+function createCard() {
+  const div = document.createElement('div');
+  div.className = 'card vcard';
+  div.innerHTML = `
+    <div class="row" style="justify-content:space-between; flex-wrap:nowrap;">
+      <div class="vtitle"><b></b> <span class="muted"></span> <span class="badge" hidden></span></div>
+      <div class="row" style="flex:0 0 auto; align-items:center; flex-wrap:nowrap;">
+        <label class="muted" style="margin-right:.25rem;">Status</label>
+        <select></select>
+        <label class="muted" style="margin-left:.5rem;">Progress</label>
+        <input type="number" min="0" style="width:100px;" />
+        <span class="muted vmax" style="min-width:80px;"></span>
+        <button class="primary">Save</button>
+        <button>Remove</button>
+      </div>
+    </div>
+  `;
+  const [saveBtn, removeBtn] = div.querySelectorAll('button');
+  saveBtn.onclick = () => { if (div.dataset.id) updateItem(Number(div.dataset.id), div); };
+  removeBtn.onclick = () => { if (div.dataset.id) deleteItem(Number(div.dataset.id)); };
+  return div;
+}
+
+function hideCard(el) {
+  el.style.display = 'none';
+  el.dataset.key = '';
+  el.dataset.id = '';
+  // Drop the ids so a parked card never shadows the visible one that now shows its item
+  el.querySelector('select').removeAttribute('id');
+  el.querySelector('input').removeAttribute('id');
+}
+
+function bindCard(el, x) {
+  const key = x ? `${x.id}:${x.status}:${x.progress}:${x.latest_release}` : 'loading';
+  if (el.dataset.key === key) return; // already showing this item; keep any in-progress edits
+  el.dataset.key = key;
+  el.dataset.id = x ? String(x.id) : '';
+  const [titleEl, typeEl, badgeEl] = [el.querySelector('b'), el.querySelector('.vtitle .muted'), el.querySelector('.badge')];
+  const [statusLabel, progressLabel] = el.querySelectorAll('label');
+  const select = el.querySelector('select');
+  const input = el.querySelector('input');
+  const maxEl = el.querySelector('.vmax');
+  if (!x) {
+    titleEl.textContent = 'Loading…';
+    typeEl.textContent = '';
+    badgeEl.hidden = true;
+    select.replaceChildren();
+    select.removeAttribute('id');
+    input.removeAttribute('id');
+    input.value = '';
+    maxEl.textContent = '';
+    return;
+  }
+  const isManga = (x.type === 'manga');
+  const options = [
+    { value: 'planning', label: 'Planning' },
+    { value: isManga ? 'reading' : 'watching', label: isManga ? 'Reading' : 'Watching' },
+    { value: 'dropped', label: 'Dropped' },
+    { value: 'completed', label: 'Completed' },
+  ];
+  titleEl.textContent = x.title;
+  typeEl.textContent = `(${x.type})`;
+  badgeEl.hidden = !x.new_release;
+  badgeEl.textContent = x.new_release ? `New: ${x.type === 'manga' ? 'ch.' : 'ep.'} ${x.latest_release}` : '';
+  select.id = `status-${x.id}`;
+  statusLabel.htmlFor = select.id;
+  select.replaceChildren(...options.map(o => new Option(o.label, o.value, false, x.status === o.value)));
+  input.id = `p-${x.id}`;
+  progressLabel.htmlFor = input.id;
+  input.value = x.progress;
+  maxEl.textContent = 'of …';
+  ensureMax(x).then(maxVal => { if (el.dataset.id === String(x.id)) maxEl.textContent = `of ${maxVal ?? '—'}`; });
+}
+
+// One /sources/max lookup per distinct title, shared by every card that shows it.
+// Only answers are cached: a failed lookup (e.g. 429) is dropped so the card retries next render.
+function ensureMax(item) {
+  const key = `${item.type}:${item.title}`;
+  if (!maxCache.has(key)) {
+    const lookup = fetch(`${apiBase}/sources/max?q=${encodeURIComponent(item.title)}&type=${encodeURIComponent(item.type)}`, { headers: { ...authHeader() } })
+      .then(resp => { if (!resp.ok) throw new Error(`max lookup failed: ${resp.status}`); return resp.json(); })
+      .then(data => data?.max ?? null)
+      .catch(() => { if (maxCache.get(key) === lookup) maxCache.delete(key); return null; });
+    maxCache.set(key, lookup);
+  }
+  return maxCache.get(key);
+}
+
+window.addEventListener('scroll', scheduleRender, { passive: true });
+window.addEventListener('resize', scheduleRender);
+
+async function addItem() {
+  if (!token) { return showLogin(); }
+  const payload = { title: title.value, type: type.value, source: source.value, status: 'planning', cover_url: selectedSuggestion?.cover_url || undefined, anilist_id: Number(selectedSuggestion?.id) || undefined, progress: Number(progress.value || 0) };
+  const resp = await fetch(`${apiBase}/library/items`, { method: 'POST', headers: { 'Content-Type': 'application/json', ...authHeader() }, body: JSON.stringify(payload) });
+  if (resp.ok) loadItems();
+}
+
+async function connectAniList() {
+  // Get a connect URL and open as a popup
+  if (!token) { return showLogin(); }
+  const resp = await fetch(`/api/anilist/connect-url`, { headers: { ...authHeader() } });
+  if (!resp.ok) return;
+  const { url } = await resp.json();
+  window.open(url, 'anilist_oauth', 'width=600,height=700');
+}
+
+window.addEventListener('message', (evt) => {
+  if (evt.data && evt.data.type === 'anilist_connected') {
+    document.getElementById('importAniListBtn').style.display = 'inline-block';
+  }
+  if (evt.data && evt.data.type === 'anilist_error') {
+    alert('AniList connection failed: ' + evt.data.message);
+  }
+});
+
+async function importAniList() {
+  const type = prompt('Import type: ANIME or MANGA', 'ANIME');
+  if (!type) return;
+  const resp = await fetch(`/api/anilist/import`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', ...authHeader() },
+    body: JSON.stringify({ media_type: type.toUpperCase() })
+  });
+  if (resp.ok) {
+    const data = await resp.json();
+    alert(`Import complete: ${data.imported} items`);
+    loadItems();
+  } else {
+    alert('Import failed');
+  }
+}
+
+let autoTimer = null;
+let selectedSuggestion = null;
+function onTitleInput(ev) {
+  selectedSuggestion = null;
+  document.getElementById('maxLabel').textContent = 'max: —';
+  if (autoTimer) clearTimeout(autoTimer);
+  const q = ev.target.value.trim();
+  if (q.length < 2) { document.getElementById('auto-list').style.display = 'none'; return; }
+  autoTimer = setTimeout(() => fetchAutocomplete(q), 180);
+}
+
+async function fetchAutocomplete(q) {
+  const t = document.getElementById('type').value;
+  const resp = await fetch(`${apiBase}/sources/autocomplete?q=${encodeURIComponent(q)}&type=${encodeURIComponent(t)}`, { headers: { ...authHeader() } });
+  if (!resp.ok) { document.getElementById('auto-list').style.display = 'none'; return; }
+  const data = await resp.json();
+  const box = document.getElementById('auto-list');
+  box.innerHTML = '';
+  data.forEach(s => {
+    const row = document.createElement('div');
+    row.className = 'row';
+    row.style.cursor = 'pointer';
+    row.style.alignItems = 'center';
+    row.onclick = () => selectSuggestion(s);
+    row.innerHTML = `
+      ${s.cover_url ? `<img src="${s.cover_url}" style="width:38px;height:38px;object-fit:cover;border-radius:.25rem;">` : ''}
+      <div style="flex:1;">${s.title}</div>
+    `;
+    box.appendChild(row);
+  });
+  box.style.display = data.length ? 'block' : 'none';
+}
+
+function selectSuggestion(s) {
+  document.getElementById('title').value = s.title;
+  selectedSuggestion = s;
+  const max = (s.type === 'manga') ? (s.chapters || null) : (s.episodes || null);
+  document.getElementById('maxLabel').textContent = `max: ${max ?? '—'}`;
+  // Prefer AniList source when chosen from suggestions
+  document.getElementById('source').value = 'anilist';
+  document.getElementById('auto-list').style.display = 'none';
+}
+
+// Simple login/register modal
+function showLogin() {
+  const div = document.createElement('div');
+  div.className = 'backdrop';
+  div.innerHTML = `<div class="modal">
+    <h3>Sign in</h3>
+    <div class="row"><input id="li-username" placeholder="Username"/> <input id="li-password" type="password" placeholder="Password"/></div>
+    <div class="row">
+      <button class="primary" id="li-login">Login</button>
+      <button id="li-register">Register</button>
+      <button onclick="this.closest('.backdrop').remove()">Close</button>
+    </div>
+  </div>`;
+  document.body.appendChild(div);
+  div.querySelector('#li-login').onclick = async () => {
+    const u = div.querySelector('#li-username').value;
+    const p = div.querySelector('#li-password').value;
+    const form = new URLSearchParams(); form.set('username', u); form.set('password', p);
+    const resp = await fetch(`${apiBase}/auth/token`, { method: 'POST', headers: { 'Content-Type': 'application/x-www-form-urlencoded' }, body: form.toString() });
+    if (resp.ok) { const data = await resp.json(); token = data.access_token; localStorage.setItem('token', token); div.remove(); onAuthChange(u); loadItems(); checkAniListStatus(); }
+    else { alert('Login failed'); }
+  };
+  div.querySelector('#li-register').onclick = async () => {
+    const u = div.querySelector('#li-username').value;
+    const p = div.querySelector('#li-password').value;
+    const resp = await fetch(`${apiBase}/auth/register`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ username: u, password: p }) });
+    if (resp.ok) { alert('Registered. Now login.'); }
+    else { alert('Register failed'); }
+  };
+}
+
+function logout() { token = ''; localStorage.removeItem('token'); onAuthChange(null); lib.generation++; resetList(''); }
+function onAuthChange(username) {
+  document.getElementById('authStatus').textContent = username ? `Signed in as ${username}` : 'Not signed in';
+  document.getElementById('loginBtn').style.display = username ? 'none' : 'inline-block';
+  document.getElementById('logoutBtn').style.display = username ? 'inline-block' : 'none';
+  document.getElementById('connectAniListBtn').style.display = username ? 'inline-block' : 'none';
+  document.getElementById('importAniListBtn').style.display = 'none';
+}
+
+async function updateItem(id, card) {
+  if (!token) return;
+  // Read the controls of the card that was clicked: pooled cards are recycled, so ids aren't a reliable handle
+  const statusEl = card.querySelector('select');
+  const progEl = card.querySelector('input');
+  const payload = {
+    status: statusEl ? statusEl.value : undefined,
+    progress: progEl && progEl.value !== '' ? Number(progEl.value) : undefined,
+  };
+  // Remove undefined to avoid sending nulls
+  Object.keys(payload).forEach(k => payload[k] === undefined && delete payload[k]);
+  if (Object.keys(payload).length === 0) return;
+  const resp = await fetch(`${apiBase}/library/items/${id}`, {
+    method: 'PATCH',
+    headers: { 'Content-Type': 'application/json', ...authHeader() },
+    body: JSON.stringify(payload)
+  });
+  if (resp.ok) {
+    loadItems();
+  }
+}
+
+async function deleteItem(id) {
+  if (!token) return;
+  const ok = confirm('Remove this item?');
+  if (!ok) return;
+  const resp = await fetch(`${apiBase}/library/items/${id}`, { method: 'DELETE', headers: { ...authHeader() } });
+  if (resp.ok) loadItems();
+}
+
+async function checkAniListStatus() {
+  if (!token) return;
+  const resp = await fetch(`/api/anilist/status`, { headers: { ...authHeader() } });
+  if (resp.ok) {
+    const data = await resp.json();
+    if (data.connected) document.getElementById('importAniListBtn').style.display = 'inline-block';
+  }
+}
+
+// initial load
+onAuthChange(null);
+loadItems();
+// suggestions removed in favor of autocomplete
@@ -0,0 +1,79 @@
+"""Build the static frontend for production serving.
+
+Copies ``frontend/`` to ``frontend/dist/``:
+- assets referenced by index.html (app.js, app.css, ...) get content-hashed names so
+  they can be cached forever (see ``app/static.py``);
+- index.html is rewritten to point at the hashed names and stays revalidated via ETag;
+- every text file gets precompressed ``.gz`` (and ``.br`` when the optional ``brotli``
+  package is installed) siblings that ``FrontendFiles`` serves directly.
+
+Usage: python scripts/build_frontend.py
+The app serves ``frontend/dist`` when it exists, otherwise ``frontend`` as-is.
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import re
+import shutil
+import sys
+from pathlib import Path
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # optional; gzip alone is fine
+    brotli = None
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "frontend"
+DIST = SRC / "dist"
+COMPRESSIBLE = {".html", ".js", ".css", ".svg", ".json", ".txt"}
+REF = re.compile(r'(?P<attr>(?:src|href))="(?P<name>[^"/:]+\.(?:js|css))"')
+
+
+def hashed_name(path: Path) -> str:
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:10]
+    return f"{path.stem}.{digest}{path.suffix}"
+
+
+def precompress(path: Path) -> None:
+    data = path.read_bytes()
+    # mtime=0 keeps output byte-identical across builds
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(data, quality=11))
+
+
+def build() -> None:
+    if DIST.exists():
+        shutil.rmtree(DIST)
+    DIST.mkdir()
+
+    index = (SRC / "index.html").read_text(encoding="utf-8")
+    renamed: dict[str, str] = {}
+
+    def rewrite(match: re.Match[str]) -> str:
+        name = match.group("name")
+        if name not in renamed:
+            renamed[name] = hashed_name(SRC / name)
+        return f'{match.group("attr")}="{renamed[name]}"'
+
+    index = REF.sub(rewrite, index)
+    for original, hashed in renamed.items():
+        shutil.copyfile(SRC / original, DIST / hashed)
+    (DIST / "index.html").write_text(index, encoding="utf-8")
+
+    # Any other files (images, 404.html, ...) are copied unchanged
+    for path in SRC.iterdir():
+        if path.is_file() and path.name != "index.html" and path.name not in renamed:
+            shutil.copyfile(path, DIST / path.name)
+
+    for path in list(DIST.iterdir()):
+        if path.suffix in COMPRESSIBLE:
+            precompress(path)
+        print(f"  {path.relative_to(ROOT)}")
+    print(f"built {DIST.relative_to(ROOT)} ({'gzip+brotli' if brotli else 'gzip'})")
+
+
+if __name__ == "__main__":
+    build()
+    sys.exit(0)
@@ -0,0 +1,56 @@
+import os
+
+# Must be set before the app is imported so the test DB and query stats headers are used
+os.environ.setdefault("TESTING", "1")
+# The suite fires many requests as one user; admission control is tested on its own app
+os.environ.setdefault("ADMISSION_ENABLED", "0")
+
+import uuid
+
+import pytest
+from app.instrumentation import QUERY_COUNT_HEADER
+
+
+@pytest.fixture
+def query_budget():
+    """Assert a response stayed within a SQL statement budget.
+
+    Usage: ``query_budget(resp, 3)``. The count comes from the dev-mode header set
+    by the middleware in ``app/main.py``, so an N+1 regression fails the test.
+    """
+    def check(resp, budget: int) -> int:
+        assert QUERY_COUNT_HEADER in resp.headers, "query stats middleware not enabled"
+        count = int(resp.headers[QUERY_COUNT_HEADER])
+        assert count <= budget, (
+            f"{resp.request.method} {resp.request.url.path} issued {count} SQL statements (budget {budget})"
+        )
+        return count
+
+    return check
+
+
+@pytest.fixture
+def user_headers():
+    """Register throwaway users and empty their libraries after the test.
+
+    Usage: ``headers = user_headers("dupes")`` returns bearer-token headers for a new
+    user named ``dupes_<random>``; ``GET /api/auth/me`` gives the username if needed.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    created = []
+
+    def make(prefix: str = "user") -> dict:
+        username = f"{prefix}_{uuid.uuid4().hex[:8]}"
+        client.post("/api/auth/register", json={"username": username, "password": "pw123456"})
+        token = client.post("/api/auth/token", data={"username": username, "password": "pw123456"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        created.append(headers)
+        return headers
+
+    yield make
+    for headers in created:
+        for item in client.get("/api/library/items", headers=headers).json():
+            client.delete(f"/api/library/items/{item['id']}", headers=headers)
@@ -1,5 +1,6 @@
 import pytest
 import httpx
+import uuid
 from fastapi import status
 from app.main import app
 from fastapi.testclient import TestClient
@@ -33,19 +34,21 @@ def test_auth_and_library_crud():
     resp = client.post("/api/library/items", json=payload, headers=headers)
     assert resp.status_code == 200
     item = resp.json()
-    assert item["id"] == 1
+    # ids are never reused (AUTOINCREMENT), so they keep growing across runs on the test DB
+    item_id = item["id"]
+    assert item_id >= 1
 
     # update progress
-    resp = client.patch("/api/library/items/1", json={"progress": 10, "status": "reading"}, headers=headers)
+    resp = client.patch(f"/api/library/items/{item_id}", json={"progress": 10, "status": "reading"}, headers=headers)
     assert resp.status_code == 200
     assert resp.json()["progress"] == 10
 
     # get
-    resp = client.get("/api/library/items/1", headers=headers)
+    resp = client.get(f"/api/library/items/{item_id}", headers=headers)
     assert resp.status_code == 200
 
     # delete
-    resp = client.delete("/api/library/items/1", headers=headers)
+    resp = client.delete(f"/api/library/items/{item_id}", headers=headers)
     assert resp.status_code == 200
 
 
@@ -60,3 +63,899 @@ def test_sources():
     resp = client.get("/api/sources/search", params={"q": "One"}, headers=headers)
     assert resp.status_code == 200
     assert len(resp.json()) >= 1
+
+
+# SQL statements allowed per endpoint; list/summary must stay constant as the library grows
+QUERY_BUDGETS = {
+    "login": 4,
+    "add": 7,  # + progress event insert and daily rollup upsert
+    "list": 3,
+    "list_page": 4,
+    "get": 3,
+    "update": 7,
+    "summary": 3,
+    "stats": 3,
+    "delete": 5,
+    "anilist_import": 11,  # constant in the number of entries
+}
+
+
+def test_query_budgets(query_budget):
+    resp = client.post("/api/auth/token", data={"username": "demo", "password": "demo1234"})
+    query_budget(resp, QUERY_BUDGETS["login"])
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    ids = []
+    for n in range(5):
+        resp = client.post("/api/library/items", json={"title": f"Budget {n}", "type": "anime", "source": "test"}, headers=headers)
+        query_budget(resp, QUERY_BUDGETS["add"])
+        ids.append(resp.json()["id"])
+
+    query_budget(client.get("/api/library/items", headers=headers), QUERY_BUDGETS["list"])
+    query_budget(client.get("/api/library/items", params={"limit": 2}, headers=headers), QUERY_BUDGETS["list_page"])
+    query_budget(client.get("/api/library/summary", headers=headers), QUERY_BUDGETS["summary"])
+    query_budget(client.get("/api/library/stats", headers=headers), QUERY_BUDGETS["stats"])
+    query_budget(client.get(f"/api/library/items/{ids[0]}", headers=headers), QUERY_BUDGETS["get"])
+    query_budget(client.patch(f"/api/library/items/{ids[0]}", json={"progress": 2}, headers=headers), QUERY_BUDGETS["update"])
+
+    for item_id in ids:
+        query_budget(client.delete(f"/api/library/items/{item_id}", headers=headers), QUERY_BUDGETS["delete"])
+
+
+def test_anilist_import_query_budget(monkeypatch, query_budget, user_headers):
+    from app.routers import anilist as anilist_router
+    from app.services import anilist_oauth
+
+    tag = uuid.uuid4().hex[:6]
+
+    def import_entries(n: int) -> int:
+        headers = user_headers("budget_import")
+        username = client.get("/api/auth/me", headers=headers).json()["username"]
+
+        async def fake_lists(access_token, media_type="ANIME"):
+            return [{"entries": [
+                {"status": "CURRENT", "progress": i, "media": {"id": 930_000 + i, "type": "ANIME", "title": {"english": f"Budget Show {tag} {i}", "romaji": f"Budget Show {tag} {i}"}, "episodes": 12}}
+                for i in range(n)
+            ]}]
+
+        monkeypatch.setattr(anilist_oauth, "fetch_user_lists", fake_lists)
+        monkeypatch.setitem(anilist_router._anilist_tokens, username, {"access_token": "x"})
+        resp = client.post("/api/anilist/import", json={"media_type": "ANIME"}, headers=headers)
+        assert resp.json() == {"imported": n}
+        return query_budget(resp, QUERY_BUDGETS["anilist_import"])
+
+    # Per-entry dedup or inserts would make the count grow with the list
+    assert import_entries(3) == import_entries(30)
+
+
+def test_frontend_cache_headers():
+    resp = client.get("/")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "no-cache"
+    etag = resp.headers["etag"]
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+
+def test_precompressed_and_hashed_assets(tmp_path):
+    import gzip
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from app.static import FrontendFiles, IMMUTABLE_CACHE
+
+    (tmp_path / "index.html").write_text("<html></html>")
+    (tmp_path / "app.0123456789.js").write_text("console.log('hi');")
+    (tmp_path / "app.0123456789.js.gz").write_bytes(gzip.compress(b"console.log('hi');"))
+    static_client = TestClient(Starlette(routes=[Mount("/", FrontendFiles(directory=tmp_path, html=True))]))
+
+    resp = static_client.get("/app.0123456789.js", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["cache-control"] == IMMUTABLE_CACHE
+    assert "javascript" in resp.headers["content-type"]
+    assert resp.text == "console.log('hi');"
+
+    resp = static_client.get("/app.0123456789.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+
+
+def test_api_gzip_over_threshold():
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"}
+    ids = []
+    for n in range(30):
+        resp = client.post("/api/library/items", json={"title": f"Compressible title {n}", "type": "manga", "source": "test"}, headers=headers)
+        ids.append(resp.json()["id"])
+    resp = client.get("/api/library/items", headers=headers)
+    assert resp.headers.get("content-encoding") == "gzip"
+    assert len(resp.json()) == 30
+    for item_id in ids:
+        client.delete(f"/api/library/items/{item_id}", headers=headers)
+
+
+def test_list_items_pagination():
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    ids = []
+    for n in range(5):
+        resp = client.post("/api/library/items", json={"title": f"Page {n}", "type": "anime", "source": "test"}, headers=headers)
+        ids.append(resp.json()["id"])
+
+    resp = client.get("/api/library/items", params={"limit": 2, "offset": 0}, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["x-total-count"] == "5"
+    assert [x["id"] for x in resp.json()] == ids[:2]
+    resp = client.get("/api/library/items", params={"limit": 2, "offset": 4}, headers=headers)
+    assert [x["id"] for x in resp.json()] == ids[4:]
+    assert client.get("/api/library/items", params={"limit": 0}, headers=headers).status_code == 422
+
+    for item_id in ids:
+        client.delete(f"/api/library/items/{item_id}", headers=headers)
+
+
+# Rarely used / heavy modules must not be imported when a worker boots
+LAZY_MODULES = ("httpx", "passlib", "app.services.anilist_oauth", "numpy", "scipy")
+# Our own import work on top of the framework floor (fastapi + sqlmodel + pydantic-settings),
+# as a fraction of that floor, so the budget holds on slow and fast machines alike
+IMPORT_OVERHEAD_RATIO = 0.5
+
+
+def test_import_time_budget():
+    import json
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    code = (
+        "import json, sys, time; t = time.perf_counter(); import fastapi, sqlmodel, pydantic_settings; "
+        "floor = time.perf_counter() - t; t = time.perf_counter(); import app.main; "
+        "print(json.dumps({'floor': floor, 'app': time.perf_counter() - t, 'modules': sorted(sys.modules)}))"
+    )
+    runs = []
+    for _ in range(3):  # best of three: a single cold import is at the mercy of the disk cache
+        out = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parent.parent, capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    eager = [m for m in LAZY_MODULES if m in runs[0]["modules"]]
+    assert not eager, f"imported at startup: {eager}"
+    best = min(runs, key=lambda r: r["app"] / r["floor"])
+    assert best["app"] < IMPORT_OVERHEAD_RATIO * best["floor"], (
+        f"import app.main took {best['app']:.3f}s on top of a {best['floor']:.3f}s framework floor"
+    )
+
+
+def test_trending_snapshot_refresh_fallback_and_warm_start(tmp_path):
+    import asyncio
+    from app.services.trending import TrendingSnapshot
+
+    calls = []
+
+    async def fake_fetch(media_type, per_page):
+        calls.append(media_type)
+        if len(calls) > 2:
+            raise RuntimeError("upstream down")
+        return [{"id": "1", "title": f"Top {media_type}", "type": media_type, "cover_url": None}]
+
+    path = str(tmp_path / "trending.json")
+    snap = TrendingSnapshot(path, fetch=fake_fetch)
+    assert snap.get("anime").items == []
+    assert asyncio.run(snap.refresh()) is True
+    assert snap.get("anime").items[0]["title"] == "Top anime"
+
+    # Upstream failure keeps the last good copy
+    assert asyncio.run(snap.refresh()) is False
+    assert snap.get("manga").items[0]["title"] == "Top manga"
+
+    # A new worker starts from the persisted snapshot without calling upstream
+    warm = TrendingSnapshot(path, fetch=fake_fetch)
+    assert warm.get("manga").items[0]["title"] == "Top manga"
+    assert len(calls) == 4
+
+
+def test_trending_refresh_runs_on_one_worker(tmp_path):
+    import asyncio
+    from app.services.trending import TrendingSnapshot
+
+    calls = []
+
+    async def fake_fetch(media_type, per_page):
+        calls.append(media_type)
+        return [{"id": str(len(calls)), "title": f"Top {media_type} {len(calls)}", "type": media_type, "cover_url": None}]
+
+    path = str(tmp_path / "trending.json")
+    lease = f"trending-test-{uuid.uuid4().hex[:8]}"
+    workers = [TrendingSnapshot(path, fetch=fake_fetch, lease=lease) for _ in range(3)]
+    refreshed = [asyncio.run(w.tick(60)) for w in workers]
+    assert refreshed == [True, False, False] and len(calls) == 2
+    # Followers serve what the lease holder persisted
+    assert {w.get("anime").items[0]["title"] for w in workers} == {"Top anime 1"}
+    assert asyncio.run(workers[0].tick(60)) is True and len(calls) == 4
+    assert asyncio.run(workers[2].tick(60)) is False
+    assert workers[2].get("manga").items[0]["title"] == "Top manga 4"
+    assert [p.name for p in tmp_path.iterdir()] == ["trending.json"]
+
+
+def test_trending_endpoint_serves_snapshot():
+    resp = client.get("/api/trending/anime")
+    assert resp.status_code == 200
+    assert resp.json()["type"] == "anime"
+    assert isinstance(resp.json()["items"], list)
+    assert client.get("/api/trending/books").status_code == 422
+
+
+def test_normalize_title():
+    from app.services.titles import normalize_title, similarity
+
+    assert normalize_title("Attack on Titan: Season 2") == normalize_title("attack on titan 2nd season")
+    assert normalize_title("Attack on Titan Season 1") == normalize_title("Attack on Titan")
+    assert normalize_title("Attack on Titan Season 2") != normalize_title("Attack on Titan")
+    assert normalize_title("Pokémon") == "pokemon"
+    assert normalize_title("The Promised Neverland!") == "promised neverland"
+    assert similarity("kaguya sama love is war", "kaguya sama love is wars") > 0.8
+
+
+def test_duplicates_and_import_dedup(monkeypatch, user_headers):
+    from app.routers import anilist as anilist_router
+    from app.services import anilist_oauth
+
+    headers = user_headers("dupes")
+    username = client.get("/api/auth/me", headers=headers).json()["username"]
+
+    for title in ["Frieren: Beyond Journey's End", "FRIEREN - Beyond Journey's End!", "Frieren Beyond Journeys End", "One Piece"]:
+        client.post("/api/library/items", json={"title": title, "type": "anime", "source": "test"}, headers=headers)
+    groups = client.get("/api/library/duplicates", headers=headers).json()
+    assert len(groups) == 1
+    assert len(groups[0]["items"]) == 3
+    exact = client.get("/api/library/duplicates", params={"threshold": 1.0}, headers=headers).json()
+    assert [len(g["items"]) for g in exact] == [2]
+
+    async def fake_lists(access_token, media_type="ANIME"):
+        def entry(i, english, romaji):
+            return {"status": "CURRENT", "progress": 1, "media": {"id": i, "type": "ANIME", "title": {"english": english, "romaji": romaji}, "episodes": 12}}
+        return [{"entries": [
+            entry(1, "ONE PIECE", "One Piece"),           # already in library (case/punctuation)
+            entry(2, None, "Sousou no Frieren"),           # new
+            entry(3, "Frieren", "Sousou no Frieren"),      # romaji matches the previous entry
+        ]}]
+
+    monkeypatch.setattr(anilist_oauth, "fetch_user_lists", fake_lists)
+    monkeypatch.setitem(anilist_router._anilist_tokens, username, {"access_token": "x"})
+    resp = client.post("/api/anilist/import", json={"media_type": "ANIME"}, headers=headers)
+    assert resp.json() == {"imported": 1}
+
+
+def test_rows_without_title_keys_are_keyed_on_first_use(monkeypatch, user_headers):
+    from sqlalchemy import delete, update
+    from sqlmodel import Session
+    from app.db import get_engine
+    from app.models import LibraryItem, TitleTrigram
+    from app.routers import anilist as anilist_router
+    from app.services import anilist_oauth
+
+    headers = user_headers("unkeyed")
+    username = client.get("/api/auth/me", headers=headers).json()["username"]
+    ids = [
+        client.post("/api/library/items", json={"title": title, "type": "anime", "source": "test"}, headers=headers).json()["id"]
+        for title in ["Mushishi", "Haikyuu!!", "Monster", "MONSTER"]
+    ]
+    # As left by an upgrade that added the column but never ran `python -m app.migrate`
+    with Session(get_engine()) as session:
+        session.exec(update(LibraryItem).where(LibraryItem.id.in_(ids)).values(title_key=""))  # type: ignore[call-overload]
+        session.exec(delete(TitleTrigram).where(TitleTrigram.item_id.in_(ids)))  # type: ignore[call-overload]
+        session.commit()
+
+    groups = client.get("/api/library/duplicates", params={"threshold": 1.0}, headers=headers).json()
+    assert [sorted(i["id"] for i in g["items"]) for g in groups] == [ids[2:]]
+    assert [len(g["items"]) for g in client.get("/api/library/duplicates", headers=headers).json()] == [2]
+
+    async def fake_lists(access_token, media_type="ANIME"):
+        return [{"entries": [
+            {"status": "CURRENT", "progress": 1, "media": {"id": 1, "type": "ANIME", "title": {"english": None, "romaji": "Mushishi"}}},
+        ]}]
+
+    monkeypatch.setattr(anilist_oauth, "fetch_user_lists", fake_lists)
+    monkeypatch.setitem(anilist_router._anilist_tokens, username, {"access_token": "x"})
+    assert client.post("/api/anilist/import", json={"media_type": "ANIME"}, headers=headers).json() == {"imported": 0}
+
+
+def test_max_uses_catalog(monkeypatch):
+    from app.routers import sources
+
+    calls = []
+
+    async def fake_search(query_text, media_type="manga", per_page=8):
+        calls.append(query_text)
+        return [
+            {"id": "10", "title": "Something Else", "titles": ["Something Else"], "type": media_type, "chapters": 5, "episodes": None},
+            {"id": "11", "title": "Blue Lock", "titles": ["Blue Lock", "Blue Lock"], "type": media_type, "chapters": 280, "episodes": None},
+        ]
+
+    monkeypatch.setattr(sources, "search_titles", fake_search)
+    headers = {"Authorization": f"Bearer {get_token()}"}
+    assert client.get("/api/sources/max", params={"q": "Blue Lock", "type": "manga"}, headers=headers).json() == {"max": 280}
+    assert client.get("/api/sources/max", params={"q": "blue-lock!", "type": "manga"}, headers=headers).json() == {"max": 280}
+    assert len(calls) <= 1
+
+    # Seeing a title again is an upsert, even from a session that never loaded the row
+    from sqlmodel import Session, select
+    from app.db import get_engine
+    from app.models import CatalogEntry
+    from app.services import catalog
+
+    title = f"Upsert check {uuid.uuid4().hex[:8]}"
+    for chapters in (10, 11):
+        with Session(get_engine()) as session:
+            catalog.remember(session, "manga", [{"id": "12", "title": title, "titles": [title], "chapters": chapters}])
+            session.commit()
+    with Session(get_engine()) as session:
+        rows = session.exec(select(CatalogEntry).where(CatalogEntry.type == "manga", CatalogEntry.title_key == title.lower())).all()
+    assert [r.chapters for r in rows] == [11]
+
+
+def test_library_export_import_roundtrip(user_headers):
+    import asyncio
+    import csv
+    import io
+    import json
+    from app.services import transfer
+
+    headers = user_headers("xfer")
+    titles = ["Mushishi", 'Title, with "quotes"\nand a newline', "Vinland Saga"]
+    for i, title in enumerate(titles):
+        client.post("/api/library/items", json={"title": title, "type": "anime", "source": "test", "progress": i}, headers=headers)
+
+    resp = client.get("/api/library/export", headers=headers)
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["title"] for r in rows] == titles
+    csv_body = client.get("/api/library/export", params={"format": "csv"}, headers=headers).content
+    assert next(csv.reader(io.StringIO(csv_body.decode())))[:3] == ["title", "type", "source"]
+
+    for item in client.get("/api/library/items", headers=headers).json():
+        client.delete(f"/api/library/items/{item['id']}", headers=headers)
+
+    resp = client.post("/api/library/import", content=csv_body, headers={**headers, "Content-Type": "text/csv"})
+    assert resp.json() == {"imported": 3, "skipped": 0, "failed": 0, "errors": []}
+    restored = client.get("/api/library/items", headers=headers).json()
+    assert [(r["title"], r["progress"]) for r in restored] == [(t, i) for i, t in enumerate(titles)]
+
+    # Re-importing skips existing titles; bad lines are reported, not fatal
+    body = "\n".join(json.dumps(r) for r in rows) + '\n{"title": ""}\nnot json\n'
+    resp = client.post("/api/library/import", params={"format": "ndjson"}, content=body, headers=headers)
+    result = resp.json()
+    assert (result["imported"], result["skipped"], result["failed"]) == (0, 3, 2)
+    assert result["errors"][0].startswith("line 4:")
+    assert client.post("/api/library/import", content=body, headers=headers).status_code == 415
+
+    # Parsing doesn't depend on how the body is chunked
+    async def chunked(data: bytes, size: int):
+        for i in range(0, len(data), size):
+            yield data[i:i + size]
+
+    async def collect(size: int):
+        return [r async for batch in transfer.parse_records(chunked(csv_body, size), "csv") for _, r in batch]
+
+    assert [r["title"] for r in asyncio.run(collect(7))] == titles
+
+
+def test_csv_import_matches_csv_reader(monkeypatch, user_headers):
+    import asyncio
+    import csv
+    import io
+    from app.services import transfer
+
+    headers = user_headers("csv_quotes")
+    tag = uuid.uuid4().hex[:6]
+    body = (
+        "title,type,progress\n"
+        f'12" Figure {tag},manga,1\n'
+        f"Plain {tag},anime,2\n"
+        f'"Quoted, with comma {tag}",anime,3\n'
+        f'"Two\nlines {tag}",anime,4\n'
+        f'"Say ""hi"" {tag}",anime,5\n'
+        f"Last {tag},anime,6\n"
+    )
+    expected = [row[0] for row in csv.reader(io.StringIO(body))][1:]
+    resp = client.post("/api/library/import", params={"format": "csv"}, content=body.encode(), headers=headers)
+    assert resp.json() == {"imported": 6, "skipped": 0, "failed": 0, "errors": []}
+    titles = {i["title"] for i in client.get("/api/library/items", headers=headers).json()}
+    assert titles == set(expected)
+
+    # A quote that never closes is reported once the record passes the cap, not at end of upload
+    monkeypatch.setattr(transfer, "MAX_CSV_RECORD_CHARS", 200)
+    consumed = []
+
+    async def runaway():
+        yield b'title,type\nFine,anime\n"Never closed,anime\n'
+        for i in range(1000):
+            consumed.append(i)
+            yield f"Row {i},anime\n".encode()
+
+    async def collect():
+        return [r async for batch in transfer.parse_records(runaway(), "csv") for r in batch]
+
+    records = asyncio.run(collect())
+    assert records == [(2, {"title": "Fine", "type": "anime"}), (3, "unterminated quoted field")]
+    assert len(consumed) < 50
+
+
+def test_import_writes_off_the_event_loop(monkeypatch, user_headers):
+    import asyncio
+    import json
+    import threading
+    import time
+    from app.services import transfer
+
+    importer, reader = user_headers("bulk"), user_headers("reader")
+    writing, written = threading.Event(), threading.Event()
+    real_index_keys = transfer.index_keys
+
+    def slow_index_keys(session, rows):
+        writing.set()
+        time.sleep(0.5)
+        real_index_keys(session, rows)
+        written.set()
+
+    monkeypatch.setattr(transfer, "index_keys", slow_index_keys)
+    body = "".join(json.dumps({"title": f"Bulk {i}", "type": "anime"}) + "\n" for i in range(3))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            upload = asyncio.create_task(ac.post("/api/library/import", content=body, headers={**importer, "Content-Type": "application/x-ndjson"}))
+            while not writing.is_set():
+                await asyncio.sleep(0.01)
+            # Served while the batch is still being written
+            resp = await ac.get("/api/library/summary", headers=reader)
+            served_during_write = not written.is_set()
+            return resp, served_during_write, await upload
+
+    resp, served_during_write, upload = asyncio.run(scenario())
+    assert resp.status_code == 200 and served_during_write
+    assert upload.json()["imported"] == 3
+
+
+def test_progress_history_and_stats(user_headers):
+    from sqlmodel import Session, select, func
+    from app.db import get_engine
+    from app.models import ProgressEvent, User as UserModel
+
+    headers = user_headers("stats")
+    username = client.get("/api/auth/me", headers=headers).json()["username"]
+
+    anime = client.post("/api/library/items", json={"title": "Mob Psycho 100", "type": "anime", "source": "test", "progress": 3}, headers=headers).json()
+    manga = client.post("/api/library/items", json={"title": "Dorohedoro", "type": "manga", "source": "test"}, headers=headers).json()
+    client.patch(f"/api/library/items/{anime['id']}", json={"progress": 5, "status": "watching"}, headers=headers)
+    client.patch(f"/api/library/items/{anime['id']}", json={"progress": 12, "status": "completed"}, headers=headers)
+    client.patch(f"/api/library/items/{anime['id']}", json={"progress": 12}, headers=headers)  # no change, no event
+    client.patch(f"/api/library/items/{manga['id']}", json={"progress": 20}, headers=headers)
+    client.post("/api/library/import", content='{"title": "Monster", "type": "manga", "progress": 40}\n', headers={**headers, "Content-Type": "application/x-ndjson"})
+
+    stats = client.get("/api/library/stats", params={"days": 7}, headers=headers).json()
+    assert stats["totals"] == {
+        "anime": {"units": 9, "updates": 2, "added": 1, "completed": 1},
+        "manga": {"units": 20, "updates": 1, "added": 2, "completed": 0},
+    }
+    assert stats["per_day"]["anime"] == round(9 / 7, 2)
+    assert len(stats["daily"]) == 2
+
+    # History outlives the item
+    client.delete(f"/api/library/items/{anime['id']}", headers=headers)
+    with Session(get_engine()) as session:
+        user_id = session.exec(select(UserModel.id).where(UserModel.username == username)).one()
+        count = session.exec(
+            select(func.count()).select_from(ProgressEvent).where(ProgressEvent.user_id == user_id, ProgressEvent.item_id == anime["id"])
+        ).one()
+    assert count == 3
+    assert client.get("/api/library/stats", params={"days": 7}, headers=headers).json()["totals"]["anime"]["units"] == 9
+
+
+def test_deleted_item_ids_are_not_reused(user_headers, tmp_path):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.schema import CreateTable
+    from sqlmodel import Session, SQLModel, select
+    from app.db import get_engine
+    from app.migrate import upgrade
+    from app.models import LibraryItem, ProgressEvent
+
+    headers = user_headers("reuse")
+    stats = lambda: client.get("/api/library/stats", params={"days": 7}, headers=headers).json()["totals"]["anime"]
+    # Delete the newest item, so SQLite's default rowid choice would hand its id out again
+    old = client.post("/api/library/items", json={"title": "Haikyu!!", "type": "anime", "source": "test"}, headers=headers).json()
+    client.patch(f"/api/library/items/{old['id']}", json={"progress": 10}, headers=headers)
+    client.delete(f"/api/library/items/{old['id']}", headers=headers)
+    new = client.post("/api/library/items", json={"title": "Ping Pong", "type": "anime", "source": "test"}, headers=headers).json()
+    assert new["id"] != old["id"]
+    client.patch(f"/api/library/items/{new['id']}", json={"progress": 4}, headers=headers)
+    with Session(get_engine()) as session:
+        kinds = session.exec(select(ProgressEvent.kind).where(ProgressEvent.item_id == new["id"]).order_by(ProgressEvent.id)).all()
+    assert kinds == ["add", "update"]
+    assert stats()["units"] == 14 and stats()["added"] == 2
+
+    # Databases created before AUTOINCREMENT are rebuilt in place by the upgrade
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    ddl = str(CreateTable(LibraryItem.__table__).compile(engine)).replace(" AUTOINCREMENT", "")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE libraryitem")
+        conn.exec_driver_sql(ddl)
+        conn.exec_driver_sql("INSERT INTO user (id, username, hashed_password, disabled) VALUES (1, 'u', 'x', 0)")
+        for i in (1, 2):
+            conn.exec_driver_sql(
+                "INSERT INTO libraryitem (id, user_id, title, title_key, type, source, status, progress, new_release, created_at, updated_at) "
+                f"VALUES ({i}, 1, 't{i}', 't{i}', 'anime', 'x', 'planning', 0, 0, '2024-01-01', '2024-01-01')"
+            )
+    upgrade(engine)
+    upgrade(engine)  # idempotent
+    with engine.begin() as conn:
+        assert "AUTOINCREMENT" in conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'libraryitem'")).scalar_one()
+        assert conn.execute(text("SELECT count(*) FROM sqlite_master WHERE tbl_name = 'libraryitem' AND type = 'index'")).scalar_one() >= 3
+        conn.exec_driver_sql("DELETE FROM libraryitem WHERE id = 2")
+        conn.exec_driver_sql(
+            "INSERT INTO libraryitem (user_id, title, title_key, type, source, status, progress, new_release, created_at, updated_at) "
+            "VALUES (1, 't3', 't3', 'anime', 'x', 'planning', 0, 0, '2024-01-01', '2024-01-01')"
+        )
+        assert conn.execute(text("SELECT max(id) FROM libraryitem")).scalar_one() == 3
+    engine.dispose()
+
+
+def test_admission_rate_limits_per_user_and_class():
+    from fastapi import FastAPI
+    from fastapi import Request
+    from app.admission import AdmissionMiddleware, CostClass, charge, classify
+    from app.routers.auth import create_access_token
+
+    assert classify("GET", "/api/sources/autocomplete") == "upstream"
+    assert classify("GET", "/api/sources/max") == "cheap"
+    assert classify("POST", "/api/library/import") == "import"
+    assert classify("GET", "/api/library/items") == "cheap"
+    assert classify("GET", "/health") is None
+
+    mini = FastAPI()
+
+    @mini.get("/api/library/items")
+    async def items():
+        return []
+
+    @mini.get("/api/sources/autocomplete")
+    async def autocomplete():
+        return []
+
+    @mini.get("/api/sources/max")
+    async def max_lookup(request: Request, miss: bool = False):
+        return {"wait": charge(request.scope, "upstream") if miss else 0.0}
+
+    classes = {
+        "cheap": CostClass("cheap", rate=0.001, burst=3, max_wait=1.0),
+        "upstream": CostClass("upstream", rate=0.5, burst=1, max_wait=0.0),
+        "import": CostClass("import", rate=0.001, burst=1, max_wait=0.0),
+    }
+    mini_client = TestClient(AdmissionMiddleware(mini, classes=classes, max_concurrency=4, max_queue=4))
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': 'bob'})}"}
+
+    assert mini_client.get("/api/sources/autocomplete", headers=alice).status_code == 200
+    resp = mini_client.get("/api/sources/autocomplete", headers=alice)
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "2"
+    # Separate buckets per class and per user
+    assert mini_client.get("/api/library/items", headers=alice).status_code == 200
+    assert mini_client.get("/api/sources/autocomplete", headers=bob).status_code == 200
+    # Catalog hits on /sources/max are cheap reads; only a miss spends the upstream budget
+    assert mini_client.get("/api/sources/max", headers=bob).json() == {"wait": 0.0}
+    assert mini_client.get("/api/sources/max", params={"miss": True}, headers=bob).json()["wait"] > 0
+    # A forged token doesn't spend alice's budget; it counts against the client IP
+    forged = {"Authorization": "Bearer not-a-jwt"}
+    assert [mini_client.get("/api/library/items", headers=forged).status_code for _ in range(4)] == [200, 200, 200, 429]
+    assert mini_client.get("/api/library/items", headers=alice).status_code == 200
+
+
+def test_admission_sheds_low_priority_when_saturated():
+    import asyncio
+    from fastapi import FastAPI
+    from app.admission import AdmissionMiddleware, CostClass
+
+    mini = FastAPI()
+    release = asyncio.Event()
+
+    @mini.get("/api/library/items")
+    async def slow():
+        await release.wait()
+        return []
+
+    @mini.post("/api/library/import")
+    async def do_import():
+        return {}
+
+    classes = {
+        "cheap": CostClass("cheap", rate=100, burst=100, max_wait=5.0),
+        "upstream": CostClass("upstream", rate=100, burst=100, max_wait=0.05),
+        "import": CostClass("import", rate=100, burst=100, max_wait=0.0),
+    }
+    guarded = AdmissionMiddleware(mini, classes=classes, max_concurrency=1, max_queue=1)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=guarded), base_url="http://t") as ac:
+            holder = asyncio.create_task(ac.get("/api/library/items"))
+            await asyncio.sleep(0.05)
+            shed = await ac.post("/api/library/import")  # no slot, imports don't queue
+            queued = asyncio.create_task(ac.get("/api/library/items"))
+            await asyncio.sleep(0.05)
+            overflow = await ac.get("/api/library/items")  # queue (size 1) is full
+            release.set()
+            return shed, overflow, await holder, await queued
+
+    shed, overflow, first, queued = asyncio.run(scenario())
+    assert shed.status_code == 503 and shed.headers["Retry-After"] == "1"
+    assert overflow.status_code == 503
+    assert first.status_code == 200 and queued.status_code == 200
+    assert guarded.gate.active == 0
+
+
+def test_recommendations_incremental_build(tmp_path, monkeypatch, user_headers):
+    import numpy as np
+    from sqlmodel import Session
+    from app.config import settings
+    from app.db import get_engine
+    from app.services import recommendations as rec
+
+    tag = uuid.uuid4().hex[:6]
+    libraries = {
+        "a": ["Cowboy Bebop", "Trigun", "Samurai Champloo"],
+        "b": ["Cowboy Bebop", "Samurai Champloo"],
+        "c": ["Cowboy Bebop", "Trigun", "Clannad"],
+    }
+    headers = {}
+    for name, titles in libraries.items():
+        headers[name] = user_headers(f"rec_{name}")
+        for title in titles:
+            client.post("/api/library/items", json={"title": f"{title} {tag}", "type": "anime", "source": "test"}, headers=headers[name])
+
+    monkeypatch.setattr(settings, "recommendations_dir", str(tmp_path))
+    assert client.get("/api/recommendations", headers=headers["b"]).json() == {"built_at": None, "items": []}
+    with Session(get_engine()) as session:
+        first = rec.build(session, str(tmp_path), k=10)
+    assert first["changed_users"] >= 3
+
+    items = client.get("/api/recommendations", headers=headers["b"]).json()["items"]
+    assert [i["title"] for i in items][:2] == [f"Trigun {tag}", f"Clannad {tag}"]
+    assert client.get("/api/recommendations", params={"type": "manga"}, headers=headers["b"]).json()["items"] == []
+
+    # Only the user whose library changed is re-read, and the result matches a full rebuild
+    client.post("/api/library/items", json={"title": f"Clannad {tag}", "type": "anime", "source": "test"}, headers=headers["b"])
+    with Session(get_engine()) as session:
+        assert rec.build(session, str(tmp_path), k=10)["changed_users"] == 1
+        incremental = rec._load_state(str(tmp_path / rec.STATE_FILE))
+        full, _ = rec.update_state(session, rec.BuildState.empty())
+    assert incremental is not None
+    order = [full.items.index(k) for k in incremental.items]
+    assert (incremental.C.toarray() == full.C.toarray()[np.ix_(order, order)]).all()
+    titles = [i["title"] for i in client.get("/api/recommendations", headers=headers["b"]).json()["items"]]
+    assert titles[0] == f"Trigun {tag}" and f"Clannad {tag}" not in titles
+
+
+def test_recommendations_skip_rows_without_title_keys(user_headers):
+    from sqlalchemy import update
+    from sqlmodel import Session
+    from app.db import get_engine
+    from app.models import LibraryItem
+    from app.services import recommendations as rec
+    from app.services.titles import ensure_keys, normalize_title
+
+    tag = uuid.uuid4().hex[:6]
+    headers = user_headers("rec_unkeyed")
+    ids = [
+        client.post("/api/library/items", json={"title": f"{title} {tag}", "type": "anime", "source": "test"}, headers=headers).json()["id"]
+        for title in ("Mononoke", "Kaiba")
+    ]
+    with Session(get_engine()) as session:
+        session.exec(update(LibraryItem).where(LibraryItem.id.in_(ids)).values(title_key=""))  # type: ignore[call-overload]
+        session.commit()
+        user_id = session.get(LibraryItem, ids[0]).user_id
+        state, _ = rec.update_state(session, rec.BuildState.empty())
+        assert not [key for _, key in state.items if key in ("", "-")]
+        assert state.X[list(state.user_ids).index(user_id)].nnz == 0
+
+        # Keying the rows (migrate or first use) re-reads the user on the next incremental run
+        ensure_keys(session, user_id)
+        state, changed = rec.update_state(session, state)
+    assert changed >= 1
+    assert ("anime", normalize_title(f"Kaiba {tag}")) in state.items
+
+
+def test_recommendations_publish_keeps_the_version_readers_may_be_loading(tmp_path):
+    import json
+    import os
+    import numpy as np
+    import scipy.sparse as sp
+    from app.services import recommendations as rec
+
+    items = [("anime", "bebop"), ("anime", "trigun")]
+    state = rec.BuildState(
+        items, ["Bebop", "Trigun"], np.arange(2, dtype=np.int64), {},
+        sp.csr_matrix(np.ones((2, 2), dtype=np.int32)), sp.csr_matrix(np.full((2, 2), 2, dtype=np.int32)),
+    )
+    out = str(tmp_path)
+    first = rec.publish(out, state, k=5)
+    loaded = rec.get_model(out)
+    assert loaded is not None and loaded.meta["version"] == first["version"]
+    second = rec.publish(out, state, k=5)
+    # A worker that read the first meta.json can still open the first version's files
+    rec.Model(out, first)
+    third = rec.publish(out, state, k=5)
+    versions = {int(n.split(".", 1)[0]) for n in os.listdir(out) if n.split(".", 1)[0].isdigit()}
+    assert versions == {second["version"], third["version"]}
+
+    # meta.json naming files that are already gone: keep serving the model that loaded
+    with open(os.path.join(out, rec.META_FILE), "w", encoding="utf-8") as f:
+        json.dump({**third, "version": first["version"]}, f)
+    os.utime(os.path.join(out, rec.META_FILE), ns=(1, 1))
+    assert rec.get_model(out) is loaded
+    assert rec.get_model(out).recommend([items[0]], limit=5)[0]["title_key"] == "trigun"
+
+
+def test_release_poller_fans_out_new_releases(user_headers):
+    import asyncio
+    from datetime import datetime, timedelta, timezone
+    from sqlmodel import Session
+    from app.db import get_engine
+    from app.models import ReleaseWatch
+    from app.services.releases import ReleasePoller
+
+    base = 900_000_000 + uuid.uuid4().int % 1_000_000  # ids no other test uses
+    airing, finished = base, base + 1
+    next_episode = {airing: 6}
+    calls = []
+
+    async def fake_fetch(ids):
+        calls.append(list(ids))
+        return [
+            {"id": airing, "type": "ANIME", "status": "RELEASING", "episodes": 12,
+             "nextAiringEpisode": {"episode": next_episode[airing], "airingAt": int(datetime.now(timezone.utc).timestamp()) + 3600}},
+            {"id": finished, "type": "MANGA", "status": "FINISHED", "chapters": 40, "nextAiringEpisode": None},
+        ]
+
+    headers = []
+    for i in range(3):
+        headers.append(user_headers(f"releases_{i}"))
+        client.post("/api/library/items", json={"title": "Airing Show", "type": "anime", "source": "anilist", "status": "watching", "progress": 3 + i, "anilist_id": airing}, headers=headers[-1])
+        client.post("/api/library/items", json={"title": "Done Manga", "type": "manga", "source": "anilist", "status": "completed", "progress": 40, "anilist_id": finished}, headers=headers[-1])
+
+    poller = ReleasePoller(fetch=fake_fetch, pause=0, lease=f"releases-test-{uuid.uuid4().hex[:8]}")
+    now = datetime.now(timezone.utc)
+    result = asyncio.run(poller.poll_once(now))
+    # One upstream query covers every user; the completed manga isn't watched at all
+    assert len(calls) == 1 and airing in calls[0] and finished not in calls[0]
+    assert result["updated_items"] >= 3
+    flags = [{i["title"]: (i["latest_release"], i["new_release"]) for i in client.get("/api/library/items", headers=h).json()} for h in headers]
+    assert [f["Airing Show"] for f in flags] == [(5, True), (5, True), (5, False)]
+    assert flags[0]["Done Manga"] == (None, False)
+
+    # Not due again until the next episode has aired
+    asyncio.run(poller.poll_once(now + timedelta(minutes=5)))
+    assert all(airing not in c for c in calls[1:])
+    with Session(get_engine()) as session:
+        watch = session.get(ReleaseWatch, airing)
+        assert watch is not None and watch.latest == 5 and watch.status == "RELEASING"
+        assert session.get(ReleaseWatch, finished) is None
+
+    # Catching up clears the flag; the next episode sets it again
+    first = client.get("/api/library/items", headers=headers[0]).json()
+    airing_item = next(i for i in first if i["title"] == "Airing Show")
+    assert client.patch(f"/api/library/items/{airing_item['id']}", json={"progress": 5}, headers=headers[0]).json()["new_release"] is False
+    next_episode[airing] = 7
+    asyncio.run(poller.poll_once(now + timedelta(hours=2)))
+    assert client.get(f"/api/library/items/{airing_item['id']}", headers=headers[0]).json()["new_release"] is True
+
+    # Once nobody is watching it, the media drops off the watchlist
+    for h in headers:
+        for item in client.get("/api/library/items", headers=h).json():
+            client.delete(f"/api/library/items/{item['id']}", headers=h)
+    with Session(get_engine()) as session:
+        poller.sync_watchlist(session, now)
+        assert session.get(ReleaseWatch, airing) is None
+
+
+def test_release_poller_catches_up_items_that_resume(user_headers):
+    import asyncio
+    from datetime import datetime, timedelta, timezone
+    from app.services.releases import ReleasePoller
+
+    anilist_id = 920_000_000 + uuid.uuid4().int % 1_000_000
+    latest = {"n": 5}
+
+    async def fake_fetch(ids):
+        return [{"id": anilist_id, "type": "ANIME", "status": "RELEASING", "episodes": latest["n"]}]
+
+    headers = [user_headers(f"resume_{i}") for i in range(2)]
+    items = [
+        client.post("/api/library/items", json={"title": "Resumed Show", "type": "anime", "source": "anilist", "status": "watching", "progress": 5, "anilist_id": anilist_id}, headers=h).json()
+        for h in headers
+    ]
+    poller = ReleasePoller(fetch=fake_fetch, pause=0, lease=f"releases-test-{uuid.uuid4().hex[:8]}")
+    now = datetime.now(timezone.utc)
+    asyncio.run(poller.poll_once(now))
+    assert client.get(f"/api/library/items/{items[0]['id']}", headers=headers[0]).json()["latest_release"] == 5
+
+    # Dropped while the other user keeps the media watched and a new episode comes out
+    client.patch(f"/api/library/items/{items[0]['id']}", json={"status": "dropped"}, headers=headers[0])
+    latest["n"] = 9
+    asyncio.run(poller.poll_once(now + timedelta(days=1)))
+    assert client.get(f"/api/library/items/{items[1]['id']}", headers=headers[1]).json()["latest_release"] == 9
+
+    # Back to watching: the next cycle brings it up to date without another upstream change
+    client.patch(f"/api/library/items/{items[0]['id']}", json={"status": "watching"}, headers=headers[0])
+    asyncio.run(poller.poll_once(now + timedelta(days=1, minutes=5)))
+    item = client.get(f"/api/library/items/{items[0]['id']}", headers=headers[0]).json()
+    assert (item["latest_release"], item["new_release"]) == (9, True)
+
+
+def test_release_poller_runs_on_one_worker(user_headers):
+    import asyncio
+    from datetime import datetime, timezone
+    from app.services import leases
+    from app.services.releases import ReleasePoller
+
+    base = 910_000_000 + uuid.uuid4().int % 1_000_000
+    ids = [base + i for i in range(5)]
+    fetched = []
+
+    async def fake_fetch(batch):
+        await asyncio.sleep(0.01)  # let the other poller interleave
+        fetched.extend(i for i in batch if i in ids)
+        return [{"id": i, "type": "ANIME", "status": "FINISHED", "episodes": 12} for i in batch]
+
+    headers = user_headers("release_workers")
+    for n, anilist_id in enumerate(ids):
+        client.post("/api/library/items", json={"title": f"Show {n}", "type": "anime", "source": "anilist", "status": "watching", "anilist_id": anilist_id}, headers=headers)
+
+    # Two workers' pollers, same lease, small batches so the cycle spans several fetches
+    lease = f"releases-test-{uuid.uuid4().hex[:8]}"
+    workers = [ReleasePoller(fetch=fake_fetch, batch_size=2, pause=0, lease=lease) for _ in range(2)]
+    now = datetime.now(timezone.utc)
+
+    async def both():
+        return await asyncio.gather(*(w.poll_once(now) for w in workers))
+
+    results = asyncio.run(both())
+    assert sorted(fetched) == ids
+    assert sorted(r["due"] == 0 for r in results) == [False, True]
+    # The follower still skips on later cycles while the holder keeps the lease
+    follower = next(w for w, r in zip(workers, results) if r["due"] == 0)
+    assert asyncio.run(follower.poll_once(now))["due"] == 0
+    leases.release(lease, next(w for w in workers if w is not follower).holder)
+
+
+def test_profiling_is_opt_in_and_admin_only(monkeypatch, user_headers):
+    import marshal
+    from fastapi import FastAPI
+    from app.config import settings
+    from app.profiling import ProfilingMiddleware
+    from app.routers import debug
+
+    # Off by default: nothing registered, so unprofiled requests pay nothing
+    assert not any(m.cls is ProfilingMiddleware for m in app.user_middleware)
+    assert client.get("/api/debug/profile").status_code != 200
+
+    headers = user_headers("admin")
+    username = client.get("/api/auth/me", headers=headers).json()["username"]
+    other = {"Authorization": f"Bearer {get_token()}"}
+    monkeypatch.setattr(settings, "profiling_admins", f"someone_else, {username}")
+
+    profiled = TestClient(ProfilingMiddleware(app))
+    resp = profiled.get("/api/library/items", headers={**headers, "X-Profile": "pstats"})
+    assert resp.status_code == 200 and resp.headers["X-Profiled-Status"] == "200"
+    assert "cumulative" in resp.text and "app/routers/library.py" in resp.text
+    raw = profiled.get("/api/library/summary", headers={**headers, "X-Profile": "raw"})
+    assert any("summary" in func for (_, _, func) in marshal.loads(raw.content))
+    # Non-admins just get the normal response
+    assert isinstance(profiled.get("/api/library/items", headers={**other, "X-Profile": "pstats"}).json(), list)
+
+    mini = FastAPI()
+    mini.include_router(debug.router, prefix="/api/debug")
+    debug_client = TestClient(mini)
+    assert debug_client.get("/api/debug/profile", params={"seconds": 0.1}, headers=other).status_code == 403
+    assert debug_client.get("/api/debug/profile", params={"seconds": 3600}, headers=headers).status_code == 422
+    resp = debug_client.get("/api/debug/profile", params={"seconds": 0.2}, headers=headers)
+    assert resp.status_code == 200
+    lines = resp.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("MainThread;" in line for line in lines)